@@ -1,20 +1,47 @@
-from fastapi import Depends
+from fastapi import Query, Request
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Literal
 from app.services.model_manager import ModelManager
 from app.services.reduction_service import DimensionalityReducer
+from app.services.cache import LRUCache
 from app.core.logging_config import setup_logger
 
 # Singleton instances
-model_manager = ModelManager()
 logger = setup_logger()
 
-def get_model_manager() -> ModelManager:
-    """Dependency for getting the model manager instance"""
-    return model_manager
+def get_model_manager(request: Request) -> ModelManager:
+    """Dependency for getting the model manager instance created in the app lifespan"""
+    return request.app.state.model_manager
+
+def get_response_cache(request: Request) -> LRUCache:
+    """Dependency for getting the cache of serialized responses created in the app lifespan"""
+    return request.app.state.response_cache
+
+def get_reduction_cache(request: Request) -> LRUCache:
+    """Dependency for getting the cache of reduced embeddings created in the app lifespan"""
+    return request.app.state.reduction_cache
+
+def get_reduction_executor(request: Request) -> ThreadPoolExecutor:
+    """Dependency for getting the bounded thread pool that runs dimensionality reductions"""
+    return request.app.state.reduction_executor
+
+def get_output_format(
+    output_format: Literal["json", "binary", "raw"] = Query("json", alias="format", description="Response format: 'json' for nested lists, 'binary' for base64-encoded bytes or 'raw' for an application/octet-stream body of a JSON header followed by the array buffers")
+) -> str:
+    """Dependency for getting the response format requested with the format query parameter"""
+    return output_format
 
 def get_logger():
     """Dependency for getting the logger instance"""
     return logger
 
+@lru_cache(maxsize=16)
 def get_reducer(method: str = "pca", n_components: int = 2) -> DimensionalityReducer:
-    """Dependency for getting a dimensionality reducer with specified parameters"""
+    """
+    Dependency for getting a dimensionality reducer with specified parameters.
+    
+    Reducers only hold their configuration (each reduce() call fits afresh),
+    so one instance per (method, n_components) is shared between requests.
+    """
     return DimensionalityReducer(method=method, n_components=n_components) 
\ No newline at end of file
@@ -1 +0,0 @@
-from app.api.endpoints import embeddings, attention, reduce, models, health, logs
@@ -1,30 +1,96 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
-import uuid
-import json
+from fastapi import APIRouter, HTTPException, Depends, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Tuple
+import numpy as np
 
 from app.models.request import AttentionRequest
 from app.models.response import AttentionResponse
-from app.api.dependencies import get_model_manager, get_logger
+from app.api.dependencies import get_model_manager, get_logger, get_output_format, get_response_cache
+from app.api.response_cache import response_cache_key, get_cached_response, cache_response, log_response_summary
 from app.services.model_manager import ModelManager
+from app.services.cache import LRUCache
+from app.services.attention_service import reduce_heads, top_k_attention
+from app.core.responses import RAW_MEDIA_TYPE, NumpyJSONResponse, encode_raw, encode_array, quantize_attention
 
 router = APIRouter()
 
-@router.post("/attention", response_model=AttentionResponse,
+def build_attention_response(
+    tokens: List[str],
+    attentions: np.ndarray,
+    data: AttentionRequest,
+    output_format: str
+) -> Tuple[Response, str]:
+    """
+    Reduce, quantize and serialize attention weights into a response.
+    
+    Args:
+        tokens: Tokens of the text
+        attentions: Attention weights, shape [num_layers, num_heads, num_tokens, num_tokens]
+        data: Request data with the precision, head reduction and top_k options
+        output_format: 'json', 'binary' or 'raw'
+        
+    Returns:
+        Tuple of the serialized response and the precision of the returned weights
+    """
+    # Shrink the payload: combine heads and keep only the top k weights per query token
+    attention, indices = attentions, None
+    head_reduction = data.head_reduction or "none"
+    if head_reduction != "none" or data.top_k:
+        attention = reduce_heads(attentions, head_reduction)
+        if data.top_k:
+            indices, attention = top_k_attention(attention, data.top_k)
+    
+    # Cast to the requested precision; binary and raw responses default to float16
+    precision = data.precision or ("fp16" if output_format != "json" else "fp32")
+    scale = None
+    if precision != "fp32" or output_format != "json":
+        attention, scale = quantize_attention(attention, precision)
+    
+    if output_format == "raw":
+        arrays = [("attention", attention)]
+        if indices is not None:
+            # Token positions fit in uint16 for any sequence whose T x T attention fits in memory
+            arrays.append(("attention_indices", indices.astype(np.uint16)))
+        http_response = Response(
+            content=encode_raw({"tokens": tokens, "model_name": data.model_name, "scale": scale}, arrays),
+            media_type=RAW_MEDIA_TYPE
+        )
+    else:
+        if output_format == "binary":
+            attention = encode_array(attention, dtype=attention.dtype)
+            if indices is not None:
+                indices = encode_array(indices, dtype=np.uint16)
+        
+        # Prepare response; model_construct skips validating every attention weight
+        response = AttentionResponse.model_construct(
+            tokens=tokens,
+            attention=attention,
+            attention_indices=indices,
+            model_name=data.model_name,
+            scale=scale
+        )
+        http_response = NumpyJSONResponse(response)
+    
+    return http_response, precision
+
+
+@router.post("/attention", response_model=None,
              summary="Get attention weights",
              description="Process text through a transformer model and return tokens and multi-head attention weights.",
              response_description="Tokens and their attention weights from all layers and heads",
              status_code=200,
              responses={
-                 200: {"description": "Successful response with tokens and attention weights"},
+                 200: {"description": "Successful response with tokens and attention weights", "model": AttentionResponse},
                  400: {"description": "Bad request, invalid model name or parameters"},
                  500: {"description": "Internal server error during processing"}
              })
 async def get_attention(
     data: AttentionRequest,
+    output_format: str = Depends(get_output_format),
     model_manager: ModelManager = Depends(get_model_manager),
+    response_cache: LRUCache = Depends(get_response_cache),
     logger = Depends(get_logger)
-) -> Dict[str, Any]:
+) -> Response:
     """
     Process text through a transformer model and return tokens and attention weights.
     
@@ -33,19 +99,26 @@ async def get_attention(
     attends to other tokens in the sequence.
     
     Args:
-        data: Request data containing text and model name
+        data: Request data containing text, model name and optional precision, head reduction and top_k
+        output_format: 'json' for nested lists, 'binary' for a base64-encoded buffer or 'raw' for packed buffers
         
     Returns:
-        Dictionary with tokens, attention weights, and model name
+        JSON response with tokens, attention weights, and model name
         
     Raises:
         HTTPException: If model loading fails or text processing encounters an error
     """
-    request_id = str(uuid.uuid4())
-    logger.info(f"Processing text for attention with model {data.model_name}")
+    logger.info("Processing text for attention with model %s", data.model_name)
+    
+    # Identical requests are answered with the already serialized response
+    cache_key = response_cache_key("attention", output_format, data)
+    cached_response = get_cached_response(response_cache, cache_key, output_format)
+    if cached_response is not None:
+        logger.info("Attention response served from cache")
+        return cached_response
     
     try:
-        tokens, attentions = model_manager.get_attention(data.text, data.model_name)
+        tokens, attentions = await model_manager.get_attention(data.text, data.model_name)
     except ValueError as e:
         error_msg = f"Failed to load model {data.model_name}: {str(e)}"
         logger.error(error_msg)
@@ -55,19 +128,17 @@ async def get_attention(
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
     
-    # Prepare response
-    response = {
-        "tokens": tokens,
-        "attention": attentions,
-        "model_name": data.model_name
-    }
+    # Post-processing and serialization grow with the square of the text length, so run
+    # them in a worker thread to keep the event loop responsive for other requests
+    http_response, precision = await run_in_threadpool(build_attention_response, tokens, attentions, data, output_format)
     
-    # Log a summary of the response
-    log_response = {
+    log_response_summary(logger, "Attention", {
         "tokens_count": len(tokens),
         "attention_layers": len(attentions),
+        "precision": precision,
+        "head_reduction": data.head_reduction or "none",
+        "top_k": data.top_k,
         "model_name": data.model_name
-    }
-    logger.info(f"Attention response summary: {json.dumps(log_response)}")
-    
-    return response 
\ No newline at end of file
+    })
+    cache_response(response_cache, cache_key, http_response)
+    return http_response 
\ No newline at end of file
@@ -1,31 +1,34 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
-import uuid
-import json
-import numpy as np
+from fastapi import APIRouter, HTTPException, Depends, Response
 
 from app.models.request import EmbeddingsRequest
 from app.models.response import EmbeddingsResponse
-from app.api.dependencies import get_model_manager, get_logger
+from app.api.dependencies import get_model_manager, get_logger, get_output_format, get_response_cache
+from app.api.response_cache import response_cache_key, get_cached_response, cache_response, log_response_summary
+from app.core.responses import RAW_MEDIA_TYPE, NumpyJSONResponse, encode_raw, encode_array, quantize_embeddings
 from app.services.model_manager import ModelManager
+from app.services.cache import LRUCache
 
 router = APIRouter()
 
-@router.post("/embeddings", response_model=EmbeddingsResponse, 
+# Responses are built from NumPy arrays and returned directly, so the response model
+# is only used for the OpenAPI docs and the arrays are never validated float by float
+@router.post("/embeddings", response_model=None,
              summary="Get token embeddings",
              description="Process text through a transformer model and return tokens and their corresponding embeddings.",
              response_description="Tokens and their embeddings from the model",
              status_code=200,
              responses={
-                 200: {"description": "Successful response with tokens and embeddings"},
+                 200: {"description": "Successful response with tokens and embeddings", "model": EmbeddingsResponse},
                  400: {"description": "Bad request, invalid model name or parameters"},
                  500: {"description": "Internal server error during processing"}
              })
 async def get_embeddings(
     data: EmbeddingsRequest,
+    output_format: str = Depends(get_output_format),
     model_manager: ModelManager = Depends(get_model_manager),
+    response_cache: LRUCache = Depends(get_response_cache),
     logger = Depends(get_logger)
-) -> Dict[str, Any]:
+) -> Response:
     """
     Process text through a transformer model and return tokens and embeddings.
     
@@ -34,18 +37,25 @@ async def get_embeddings(
     
     Args:
         data: Request data containing text and model name
+        output_format: 'json' for nested lists, 'binary' for a base64-encoded buffer or 'raw' for packed buffers
         
     Returns:
-        Dictionary with tokens, embeddings, and model name
+        JSON response with tokens, embeddings, and model name
         
     Raises:
         HTTPException: If model loading fails or text processing encounters an error
     """
-    request_id = str(uuid.uuid4())
-    logger.info(f"Processing text for embeddings with model {data.model_name}")
+    logger.info("Processing text for embeddings with model %s", data.model_name)
+    
+    # Identical requests are answered with the already serialized response
+    cache_key = response_cache_key("embeddings", output_format, data)
+    cached_response = get_cached_response(response_cache, cache_key, output_format)
+    if cached_response is not None:
+        logger.info("Embeddings response served from cache")
+        return cached_response
     
     try:
-        tokens, hidden_states = model_manager.get_embeddings(data.text, data.model_name)
+        tokens, hidden_states = await model_manager.get_embeddings(data.text, data.model_name)
     except ValueError as e:
         error_msg = f"Failed to load model {data.model_name}: {str(e)}"
         logger.error(error_msg)
@@ -55,19 +65,34 @@ async def get_embeddings(
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
     
-    # Prepare response
-    response = {
-        "tokens": tokens,
-        "embeddings": hidden_states.tolist(),
-        "model_name": data.model_name
-    }
+    # Cast to the requested precision; binary and raw responses default to float16
+    precision = data.precision or ("fp16" if output_format != "json" else "fp32")
+    embeddings, scale = quantize_embeddings(hidden_states, precision)
     
-    # Log a summary of the response
-    log_response = {
+    if output_format == "raw":
+        arrays = [("embeddings", embeddings)]
+        if scale is not None:
+            arrays.append(("scale", scale))
+        http_response = Response(
+            content=encode_raw({"tokens": tokens, "model_name": data.model_name}, arrays),
+            media_type=RAW_MEDIA_TYPE
+        )
+    else:
+        # Prepare response; model_construct skips validation so the embeddings
+        # array is kept as is and serialized directly by orjson
+        response = EmbeddingsResponse.model_construct(
+            tokens=tokens,
+            embeddings=encode_array(embeddings, dtype=embeddings.dtype) if output_format == "binary" else embeddings,
+            model_name=data.model_name,
+            scale=scale
+        )
+        http_response = NumpyJSONResponse(response)
+    
+    log_response_summary(logger, "Embeddings", {
         "tokens_count": len(tokens),
         "embeddings_shape": list(hidden_states.shape),
+        "precision": precision,
         "model_name": data.model_name
-    }
-    logger.info(f"Embeddings response summary: {json.dumps(log_response)}")
-    
-    return response 
\ No newline at end of file
+    })
+    cache_response(response_cache, cache_key, http_response)
+    return http_response 
\ No newline at end of file
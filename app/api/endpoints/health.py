@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends
-from typing import Dict
+from typing import Dict, Any
 
 from app.models.response import HealthResponse
-from app.api.dependencies import get_logger
+from app.api.dependencies import get_model_manager, get_logger
+from app.services.model_manager import ModelManager
 
 router = APIRouter()
 
@@ -12,8 +13,9 @@ router = APIRouter()
             response_description="Health status of the service",
             status_code=200)
 async def health_check(
+    model_manager: ModelManager = Depends(get_model_manager),
     logger = Depends(get_logger)
-) -> Dict[str, str]:
+) -> Dict[str, Any]:
     """
     Perform a health check on the service.
     
@@ -21,7 +23,7 @@ async def health_check(
     It can be used for monitoring and health checks by load balancers or orchestration systems.
     
     Returns:
-        Dictionary with health status
+        Dictionary with health status and model output cache statistics
     """
     logger.info("Health check requested")
-    return {"status": "healthy"} 
\ No newline at end of file
+    return {"status": "healthy", "cache": model_manager.cache_stats()} 
\ No newline at end of file
@@ -1,12 +1,54 @@
 from fastapi import APIRouter, Depends, Query
-from typing import Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict
 import os
 
 from app.models.response import LogsResponse
 from app.api.dependencies import get_logger
+from app.core.logging_config import get_recent_log_lines
 
 router = APIRouter()
 
+def read_last_lines(log_file: str, lines: int, block_size: int = 8192) -> str:
+    """
+    Read the last lines of a file by seeking backwards from its end.
+    
+    Only the tail of the file is read: blocks of doubling size are read backwards
+    from the end until they contain enough newlines, and every byte is read once,
+    so the cost does not depend on file size.
+    
+    Args:
+        log_file: Path to the file
+        lines: Number of lines to return
+        block_size: Size of the first block read from the end of the file
+        
+    Returns:
+        The last lines of the file as a single string
+    """
+    with open(log_file, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks = []
+        newlines = 0
+        # One newline more than lines is needed to find where the first line starts
+        while position > 0 and newlines <= lines:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            block = f.read(read_size)
+            blocks.append(block)
+            newlines += block.count(b"\n")
+            block_size *= 2
+    data = b"".join(reversed(blocks))
+    
+    # Find the newline preceding the requested lines, ignoring the final one
+    pos = len(data) - 1 if data.endswith(b"\n") else len(data)
+    for _ in range(lines):
+        pos = data.rfind(b"\n", 0, pos)
+        if pos == -1:
+            break
+    
+    return data[pos + 1:].decode("utf-8", errors="replace")
+
 @router.get("/logs", response_model=LogsResponse,
             summary="Get recent logs",
             description="Retrieve recent log entries from the service.",
@@ -23,7 +65,8 @@ async def get_logs(
     """
     Retrieve recent log entries from the service.
     
-    This endpoint returns the most recent log entries from the service's log file.
+    This endpoint returns the most recent log entries, kept in memory for lines logged
+    by this process and read from the end of the service's log file otherwise.
     It's useful for debugging and monitoring the service's operation.
     
     Args:
@@ -35,16 +78,19 @@ async def get_logs(
     Raises:
         HTTPException: If log file cannot be read or processed
     """
+    # Lines logged by this process are served from memory
+    recent = get_recent_log_lines(lines)
+    if recent is not None:
+        return {"logs": recent}
+    
     log_file = os.path.join("logs", "api.log")
     if not os.path.exists(log_file):
         return {"logs": "No log file found"}
     
     try:
-        with open(log_file, "r") as f:
-            # Read the last 'lines' lines from the log file
-            log_lines = f.readlines()
-            log_lines = log_lines[-lines:] if len(log_lines) > lines else log_lines
-            return {"logs": "".join(log_lines)}
+        # Read the last 'lines' lines from the log file in a worker thread,
+        # so that file I/O does not block the event loop
+        return {"logs": await run_in_threadpool(read_last_lines, log_file, lines)}
     except Exception as e:
-        logger.error(f"Error reading log file: {str(e)}")
+        logger.error("Error reading log file: %s", e)
         return {"logs": f"Error reading log file: {str(e)}"} 
\ No newline at end of file
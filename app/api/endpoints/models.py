@@ -26,5 +26,5 @@ async def get_models(
         Dictionary with a list of available model names
     """
     models = model_manager.list_models()
-    logger.info(f"Listing available models: {models}")
+    logger.info("Listing available models: %s", models)
     return {"models": models} 
\ No newline at end of file
@@ -1,53 +1,44 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import Dict, Any
-import uuid
-import json
+from fastapi import APIRouter, HTTPException, Depends, Response
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+from typing import List, Tuple
 import numpy as np
+import logging
 
 from app.models.request import ReduceRequest
 from app.models.response import ReduceResponse
-from app.api.dependencies import get_model_manager, get_logger, get_reducer
+from app.api.dependencies import get_model_manager, get_logger, get_output_format, get_response_cache, get_reduction_executor, get_reduction_cache, get_reducer
+from app.api.response_cache import response_cache_key, get_cached_response, cache_response, log_response_summary
 from app.services.model_manager import ModelManager
-from app.services.reduction_service import DimensionalityReducer
+from app.services.cache import LRUCache, hash_key
+from app.core.responses import RAW_MEDIA_TYPE, NumpyJSONResponse, encode_raw, encode_array, quantize_embeddings
 
 router = APIRouter()
 
-@router.post("/reduce", response_model=ReduceResponse,
-             summary="Get dimensionally reduced embeddings",
-             description="Process text through a transformer model, extract embeddings, and reduce their dimensionality.",
-             response_description="Tokens and their dimensionally reduced embeddings",
-             status_code=200,
-             responses={
-                 200: {"description": "Successful response with tokens and reduced embeddings"},
-                 400: {"description": "Bad request, invalid model name, reduction method, or parameters"},
-                 500: {"description": "Internal server error during processing"}
-             })
-async def reduce_embeddings(
+async def compute_reduction(
     data: ReduceRequest,
-    model_manager: ModelManager = Depends(get_model_manager),
-    logger = Depends(get_logger)
-) -> Dict[str, Any]:
+    model_manager: ModelManager,
+    reduction_executor: ThreadPoolExecutor,
+    logger: logging.Logger
+) -> Tuple[List[str], np.ndarray]:
     """
-    Process text through a transformer model and return tokens with reduced-dimension embeddings.
-    
-    The endpoint tokenizes the input text, extracts embeddings, and applies dimensionality
-    reduction (PCA or UMAP) to create 2D or 3D representations suitable for visualization.
+    Get the embeddings of the request text and reduce their dimensionality.
     
     Args:
         data: Request data containing text, model name, reduction method, and number of components
+        model_manager: Model manager providing the embeddings
+        reduction_executor: Thread pool running the CPU-bound reduction
+        logger: Logger for progress and errors
         
     Returns:
-        Dictionary with tokens, reduced embeddings, and model name
+        Tuple of (tokens, reduced embeddings)
         
     Raises:
         HTTPException: If model loading fails, reduction method is invalid, or processing encounters an error
     """
-    request_id = str(uuid.uuid4())
-    logger.info(f"Processing text for dimensionality reduction with model {data.model_name}")
-    
     # Get embeddings
     try:
-        tokens, hidden_states = model_manager.get_embeddings_for_reduction(data.text, data.model_name)
+        tokens, hidden_states = await model_manager.get_embeddings_for_reduction(data.text, data.model_name)
     except ValueError as e:
         error_msg = f"Failed to load model {data.model_name}: {str(e)}"
         logger.error(error_msg)
@@ -59,28 +50,105 @@ async def reduce_embeddings(
     
     # Perform dimensionality reduction
     try:
-        reducer = get_reducer(method=data.reduction_method, n_components=data.n_components)
-        reduced = reducer.reduce(hidden_states)
-        reduced_embeddings = reduced.tolist()
-        logger.info(f"Dimensionality reduction successful, shape: {np.array(reduced_embeddings).shape}")
+        if data.basis == "reference":
+            if data.reduction_method != "pca":
+                raise ValueError("The reference basis is only supported for the pca method")
+            reducer = await model_manager.get_reference_reducer(data.model_name, data.n_components)
+        else:
+            reducer = get_reducer(method=data.reduction_method, n_components=data.n_components)
+        # PCA/UMAP fitting is CPU-bound, so run it off the event loop in the bounded reduction pool
+        reduced = await asyncio.get_running_loop().run_in_executor(reduction_executor, reducer.reduce, hidden_states)
+        logger.info("Dimensionality reduction successful, shape: %s", reduced.shape)
     except Exception as e:
         error_msg = f"Dimensionality reduction failed: {str(e)}"
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=error_msg)
     
-    # Prepare response
-    response = {
-        "tokens": tokens,
-        "reduced_embeddings": reduced_embeddings,
-        "model_name": data.model_name
-    }
+    return tokens, reduced
+
+@router.post("/reduce", response_model=None,
+             summary="Get dimensionally reduced embeddings",
+             description="Process text through a transformer model, extract embeddings, and reduce their dimensionality.",
+             response_description="Tokens and their dimensionally reduced embeddings",
+             status_code=200,
+             responses={
+                 200: {"description": "Successful response with tokens and reduced embeddings", "model": ReduceResponse},
+                 400: {"description": "Bad request, invalid model name, reduction method, or parameters"},
+                 500: {"description": "Internal server error during processing"}
+             })
+async def reduce_embeddings(
+    data: ReduceRequest,
+    output_format: str = Depends(get_output_format),
+    model_manager: ModelManager = Depends(get_model_manager),
+    response_cache: LRUCache = Depends(get_response_cache),
+    reduction_cache: LRUCache = Depends(get_reduction_cache),
+    reduction_executor: ThreadPoolExecutor = Depends(get_reduction_executor),
+    logger = Depends(get_logger)
+) -> Response:
+    """
+    Process text through a transformer model and return tokens with reduced-dimension embeddings.
+    
+    The endpoint tokenizes the input text, extracts embeddings, and applies dimensionality
+    reduction (PCA or UMAP) to create 2D or 3D representations suitable for visualization.
+    
+    Args:
+        data: Request data containing text, model name, reduction method, and number of components
+        output_format: 'json' for nested lists, 'binary' for a base64-encoded buffer or 'raw' for packed buffers
+        
+    Returns:
+        JSON response with tokens, reduced embeddings, and model name
+        
+    Raises:
+        HTTPException: If model loading fails, reduction method is invalid, or processing encounters an error
+    """
+    logger.info("Processing text for dimensionality reduction with model %s", data.model_name)
+    
+    # Identical requests are answered with the already serialized response
+    cache_key = response_cache_key("reduce", output_format, data)
+    cached_response = get_cached_response(response_cache, cache_key, output_format)
+    if cached_response is not None:
+        logger.info("Dimensionality reduction response served from cache")
+        return cached_response
+    
+    # Reductions are cached apart from responses, so a text is not reduced again when it
+    # is requested in another format or precision; UMAP layouts stay stable while cached
+    reduction_key = (data.model_name, hash_key(data.model_dump_json(include={"text", "reduction_method", "n_components", "basis"})))
+    cached_reduction = reduction_cache.get(reduction_key)
+    if cached_reduction is not None:
+        logger.info("Dimensionality reduction served from cache")
+        tokens, reduced = cached_reduction
+    else:
+        tokens, reduced = await compute_reduction(data, model_manager, reduction_executor, logger)
+        # Cached arrays are shared between requests, so guard them against mutation
+        reduced.setflags(write=False)
+        reduction_cache.put(reduction_key, (tokens, reduced))
     
-    # Log a summary of the response
-    log_response = {
+    # Cast to the requested precision only after reducing at full precision
+    values, scale = quantize_embeddings(reduced, data.precision or "fp32")
+    
+    if output_format == "raw":
+        arrays = [("reduced_embeddings", values)]
+        if scale is not None:
+            arrays.append(("scale", scale))
+        http_response = Response(
+            content=encode_raw({"tokens": tokens, "model_name": data.model_name}, arrays),
+            media_type=RAW_MEDIA_TYPE
+        )
+    else:
+        # Prepare response; model_construct skips validation so the reduced
+        # array is kept as is and serialized directly by orjson
+        response = ReduceResponse.model_construct(
+            tokens=tokens,
+            reduced_embeddings=encode_array(values, dtype=values.dtype) if output_format == "binary" else values,
+            model_name=data.model_name,
+            scale=scale
+        )
+        http_response = NumpyJSONResponse(response)
+    
+    log_response_summary(logger, "Reduced embeddings", {
         "tokens_count": len(tokens),
-        "reduced_embeddings_shape": list(np.array(reduced_embeddings).shape),
+        "reduced_embeddings_shape": list(reduced.shape),
         "model_name": data.model_name
-    }
-    logger.info(f"Reduced embeddings response summary: {json.dumps(log_response)}")
-    
-    return response 
\ No newline at end of file
+    })
+    cache_response(response_cache, cache_key, http_response)
+    return http_response 
\ No newline at end of file
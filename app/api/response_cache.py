@@ -0,0 +1,40 @@
+from fastapi import Response
+from pydantic import BaseModel
+from typing import Any, Dict, Hashable, Optional, Tuple
+import logging
+import orjson
+
+from app.core.responses import RAW_MEDIA_TYPE, NumpyJSONResponse
+from app.services.cache import LRUCache, hash_key
+
+def response_cache_key(endpoint: str, output_format: str, data: BaseModel) -> Tuple[str, bytes]:
+    """
+    Build the cache key of a response.
+
+    Keys start with the model name, so the responses of a model can be dropped when it is unloaded.
+
+    Args:
+        endpoint: Name of the endpoint, e.g. 'embeddings'
+        output_format: 'json', 'binary' or 'raw'
+        data: Request data with a model_name field
+
+    Returns:
+        Tuple of (model_name, hash of the endpoint, format and request data)
+    """
+    return data.model_name, hash_key(endpoint, output_format, data.model_dump_json())
+
+def get_cached_response(response_cache: LRUCache, key: Hashable, output_format: str) -> Optional[Response]:
+    """Get the already serialized response of an identical request, if cached"""
+    cached_body = response_cache.get(key)
+    if cached_body is None:
+        return None
+    return Response(content=cached_body, media_type=RAW_MEDIA_TYPE if output_format == "raw" else NumpyJSONResponse.media_type)
+
+def cache_response(response_cache: LRUCache, key: Hashable, response: Response) -> None:
+    """Store the serialized body of a response for identical requests"""
+    response_cache.put(key, response.body)
+
+def log_response_summary(logger: logging.Logger, label: str, summary: Dict[str, Any]) -> None:
+    """Log a summary of a response, skipping the serialization when INFO is disabled"""
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("%s response summary: %s", label, orjson.dumps(summary).decode())
@@ -1,12 +1,86 @@
+import atexit
+import itertools
 import logging
 import os
-from logging.handlers import RotatingFileHandler
-from typing import Optional
+import queue
+import time
+from collections import deque
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Deque, Dict, Optional
+
+# Id of the request being handled, set by the logging middleware
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Request ids are a per-process prefix (pid and start time) followed by a counter
+_request_id_prefix = f"{os.getpid()}-{time.time_ns() // 1_000_000:x}"
+_request_counter = itertools.count(1)
+
+# Background listeners writing queued records, one per configured logger
+_listeners: Dict[str, QueueListener] = {}
+
+# In-memory buffers of recently logged lines, one per configured logger
+_ring_buffers: Dict[str, "RingBufferHandler"] = {}
+
+# Number of formatted log lines kept in memory
+RING_BUFFER_LINES = 1000
+
+def next_request_id() -> str:
+    """Get a new request id, unique across workers and restarts"""
+    return f"{_request_id_prefix}-{next(_request_counter)}"
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every log record"""
+    
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+class RingBufferHandler(logging.Handler):
+    """Keep the most recent formatted log lines in memory"""
+    
+    def __init__(self, capacity: int = RING_BUFFER_LINES):
+        super().__init__()
+        self.lines: Deque[str] = deque(maxlen=capacity)
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            # Multi-line records (e.g. tracebacks) count as several lines, as in the log file
+            self.lines.extend(self.format(record).splitlines())
+        except Exception:
+            self.handleError(record)
+    
+    def tail(self, lines: int) -> Optional[str]:
+        """Return the last lines joined like in the log file, or None if fewer are buffered"""
+        with self.lock:
+            if len(self.lines) < lines:
+                return None
+            recent = list(self.lines)[-lines:]
+        return "\n".join(recent) + "\n"
+
+def get_recent_log_lines(lines: int, name: str = "api") -> Optional[str]:
+    """
+    Get the last log lines of a logger from memory.
+    
+    Args:
+        lines: Number of lines to return
+        name: Name of the logger
+        
+    Returns:
+        The last lines as a single string, or None if fewer lines were logged by
+        this process, in which case the log file has to be read
+    """
+    buffer = _ring_buffers.get(name)
+    return buffer.tail(lines) if buffer is not None else None
 
 def setup_logger(name: str = "api", log_dir: str = "logs") -> logging.Logger:
     """
     Set up and configure a logger with console and file handlers.
     
+    The logger itself only puts records on a queue; a background listener
+    thread passes them to the console and file handlers, so logging calls
+    never block on terminal or disk I/O.
+    
     Args:
         name: Name of the logger
         log_dir: Directory to store log files
@@ -26,10 +100,14 @@ def setup_logger(name: str = "api", log_dir: str = "logs") -> logging.Logger:
     if logger.handlers:
         logger.handlers.clear()
     
+    # Stop the listener of a previous setup of this logger
+    if name in _listeners:
+        _stop_listener(_listeners.pop(name))
+    
     # Create console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    console_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s')
     console_handler.setFormatter(console_format)
     
     # Create file handler for detailed logs
@@ -39,11 +117,36 @@ def setup_logger(name: str = "api", log_dir: str = "logs") -> logging.Logger:
         backupCount=5
     )
     file_handler.setLevel(logging.INFO)
-    file_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    file_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s')
     file_handler.setFormatter(file_format)
     
-    # Add handlers to logger
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    # Keep recent lines in memory as well, so /logs does not have to read the file
+    ring_buffer = RingBufferHandler()
+    ring_buffer.setLevel(logging.INFO)
+    ring_buffer.setFormatter(file_format)
+    _ring_buffers[name] = ring_buffer
+    
+    # Hand records to the handlers through a queue drained by a background thread
+    log_queue: queue.Queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, console_handler, file_handler, ring_buffer, respect_handler_level=True)
+    listener.start()
+    _listeners[name] = listener
     
-    return logger 
\ No newline at end of file
+    # Add queue handler to logger; the request id is read here, in the logging thread's context
+    queue_handler = QueueHandler(log_queue)
+    queue_handler.addFilter(RequestIdFilter())
+    logger.addHandler(queue_handler)
+    
+    return logger
+
+def _stop_listener(listener: QueueListener) -> None:
+    """Flush pending records and close the listener's handlers"""
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
+
+@atexit.register
+def _stop_listeners() -> None:
+    for listener in _listeners.values():
+        _stop_listener(listener)
+    _listeners.clear() 
\ No newline at end of file
@@ -0,0 +1,184 @@
+from typing import Any, Dict, List, Literal, Optional, Tuple
+import base64
+import struct
+import numpy as np
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+
+
+Precision = Literal["fp32", "fp16", "int8"]
+
+# Media type of responses packed by encode_raw
+RAW_MEDIA_TYPE = "application/octet-stream"
+
+# Offsets of raw array buffers are aligned so that clients can view them as typed arrays in place
+_RAW_ALIGNMENT = 8
+
+
+def _default(obj: Any) -> Any:
+    """Fallback for values orjson cannot serialize natively"""
+    if isinstance(obj, BaseModel):
+        # Shallow field dict, so arrays in unvalidated (model_construct) models stay arrays
+        return dict(obj)
+    if isinstance(obj, np.ndarray):
+        # orjson has no float16 support, so widen half precision values (which float32 holds exactly)
+        if obj.dtype == np.float16:
+            return obj.astype(np.float32)
+        # orjson only serializes C-contiguous arrays directly (e.g. not slices); an array that
+        # is already contiguous has a dtype orjson does not support, so fall back to lists
+        if obj.flags.c_contiguous:
+            return obj.tolist()
+        return np.ascontiguousarray(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def encode_array(array: np.ndarray, dtype: Any = np.float16) -> Dict[str, Any]:
+    """
+    Encode an array as base64 raw bytes together with its shape and dtype.
+
+    Args:
+        array: Array to encode
+        dtype: Dtype the values are cast to before encoding
+
+    Returns:
+        Dictionary with the shape, dtype name and base64-encoded little-endian C-order bytes
+    """
+    array = np.ascontiguousarray(array, dtype=np.dtype(dtype).newbyteorder("<"))
+    return {
+        "shape": list(array.shape),
+        "dtype": array.dtype.name,
+        "data_b64": base64.b64encode(array.tobytes()).decode("ascii"),
+    }
+
+
+def encode_raw(header: Dict[str, Any], arrays: List[Tuple[str, np.ndarray]]) -> bytes:
+    """
+    Pack arrays into a single binary body described by a JSON header.
+
+    The body is a little-endian uint32 with the byte length of the header, the
+    UTF-8 JSON header padded with spaces, and then the array buffers. The header
+    lists every array under "arrays" with its name, shape, dtype, and the offset
+    and length in bytes of its little-endian C-order data, counted from the start
+    of the body. Offsets are multiples of 8.
+
+    Args:
+        header: JSON-serializable metadata, e.g. tokens and model name
+        arrays: (name, array) pairs in the order their buffers are written
+
+    Returns:
+        The packed body
+    """
+    buffers = [np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<")) for _, array in arrays]
+    entries = [
+        {"name": name, "shape": list(buffer.shape), "dtype": buffer.dtype.name, "offset": 0, "nbytes": buffer.nbytes}
+        for (name, _), buffer in zip(arrays, buffers)
+    ]
+
+    def _pad(length: int) -> int:
+        return -length % _RAW_ALIGNMENT
+
+    # Offsets depend on the header length, which depends on the offsets; lay out the buffers
+    # after a header sized with placeholder offsets, then grow it until the offsets fit
+    header_length = 0
+    while True:
+        offset = 4 + header_length
+        for entry in entries:
+            entry["offset"] = offset
+            offset += entry["nbytes"] + _pad(entry["nbytes"])
+        encoded = orjson.dumps({**header, "arrays": entries}, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+        if len(encoded) <= header_length:
+            break
+        header_length = len(encoded) + _pad(4 + len(encoded))
+
+    parts = [struct.pack("<I", header_length), encoded.ljust(header_length)]
+    for buffer in buffers:
+        parts.append(buffer.tobytes())
+        parts.append(bytes(_pad(buffer.nbytes)))
+    return b"".join(parts)
+
+
+def decode_raw(body: bytes) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """
+    Unpack a body produced by encode_raw.
+
+    Args:
+        body: Packed body
+
+    Returns:
+        Tuple of (header, arrays by name); the arrays are read-only views of body
+    """
+    (header_length,) = struct.unpack_from("<I", body)
+    header = orjson.loads(body[4:4 + header_length])
+    arrays = {
+        entry["name"]: np.frombuffer(
+            body, dtype=np.dtype(entry["dtype"]).newbyteorder("<"), count=int(np.prod(entry["shape"])), offset=entry["offset"]
+        ).reshape(entry["shape"])
+        for entry in header["arrays"]
+    }
+    return header, arrays
+
+
+def quantize_embeddings(array: np.ndarray, precision: Precision) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Cast embeddings to the requested precision.
+
+    For int8 every token (row) is scaled symmetrically by its own maximum absolute
+    value, so that values can be restored with values * scale[:, None].
+
+    Args:
+        array: Embeddings of shape [num_tokens, dim]
+        precision: 'fp32', 'fp16' or 'int8'
+
+    Returns:
+        Tuple of (cast values, per-token scales or None)
+    """
+    if precision == "fp32":
+        return array.astype(np.float32, copy=False), None
+    if precision == "fp16":
+        return array.astype(np.float16), None
+
+    scale = np.abs(array).max(axis=-1) / 127.0
+    # All-zero rows would otherwise divide by zero
+    scale[scale == 0] = 1.0
+    values = np.rint(array / scale[..., None]).clip(-127, 127).astype(np.int8)
+    return values, scale.astype(np.float32)
+
+
+def quantize_attention(array: np.ndarray, precision: Precision) -> Tuple[np.ndarray, Optional[float]]:
+    """
+    Cast attention weights to the requested precision.
+
+    Attention weights are probabilities in [0, 1], so int8 precision is stored as
+    uint8 with a fixed scale of 1/255.
+
+    Args:
+        array: Attention weights of shape [num_layers, num_heads, num_tokens, num_tokens]
+        precision: 'fp32', 'fp16' or 'int8'
+
+    Returns:
+        Tuple of (cast values, scale or None)
+    """
+    if precision == "fp32":
+        return array.astype(np.float32, copy=False), None
+    if precision == "fp16":
+        return array.astype(np.float16), None
+
+    values = np.rint(array * 255.0).clip(0, 255).astype(np.uint8)
+    return values, 1.0 / 255.0
+
+
+class NumpyJSONResponse(ORJSONResponse):
+    """
+    JSON response rendered with orjson that serializes NumPy arrays directly,
+    without converting them to nested Python lists first.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(
+            content,
+            default=_default,
+            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+        )
@@ -1,15 +1,118 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import asyncio
+import os
 import time
-import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
+import torch
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from app.api.router import api_router
-from app.core.logging_config import setup_logger
+from app.core.logging_config import setup_logger, request_id_var, next_request_id
+from app.core.responses import NumpyJSONResponse
+from app.services.model_manager import ModelManager
+from app.services.cache import LRUCache
 
 # Set up logger
 logger = setup_logger()
 
+# Models loaded and warmed up in the background at startup (comma-separated, default: none)
+PRELOAD_MODELS = [name.strip() for name in os.getenv("PRELOAD_MODELS", "").split(",") if name.strip()]
+
+# Dynamic batching of concurrent requests into one forward pass per model
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "16"))
+BATCH_WAIT_TIMEOUT_MS = float(os.getenv("BATCH_WAIT_TIMEOUT_MS", "10"))
+MAX_TOKENS_PER_BATCH = int(os.getenv("MAX_TOKENS_PER_BATCH", "8192"))
+
+# Number of models kept loaded; the least recently used one is unloaded beyond that
+MAX_CACHED_MODELS = int(os.getenv("MAX_CACHED_MODELS", "4"))
+
+# Release cached CUDA memory every this many batches to limit allocator fragmentation (0 disables it)
+EMPTY_CACHE_EVERY = int(os.getenv("EMPTY_CACHE_EVERY", "0"))
+
+# Intra-op threads used by torch for a forward pass (default: torch's choice, one per physical core)
+TORCH_NUM_THREADS = int(os.getenv("TORCH_NUM_THREADS", "0"))
+
+# Threads running CPU-bound dimensionality reductions, so concurrent /reduce requests cannot spawn more;
+# each reduction already runs multithreaded BLAS (PCA) or Numba (UMAP) kernels across all cores,
+# so a small pool keeps concurrent reductions from oversubscribing the CPU
+REDUCTION_WORKERS = int(os.getenv("REDUCTION_WORKERS", "2"))
+
+# Number of model outputs (tokens, embeddings and attention) kept for repeated texts, and the
+# megabytes their arrays may take in total (0 disables the cache)
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+RESULT_CACHE_MB = int(os.getenv("RESULT_CACHE_MB", "512"))
+
+# Number of serialized responses kept for repeated identical requests, and the megabytes
+# their bodies may take in total (0 disables the cache)
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_MB = int(os.getenv("RESPONSE_CACHE_MB", "64"))
+
+# Number of reduced embeddings kept for texts reduced again in another format or precision (0 disables the cache)
+REDUCTION_CACHE_SIZE = int(os.getenv("REDUCTION_CACHE_SIZE", "256"))
+
+# Compile model forward passes with torch.compile (opt-in)
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "false").lower() in ("1", "true", "yes")
+
+# Device and dtype models run with (default: cuda in bfloat16 or float16 if available, otherwise cpu in float32)
+MODEL_DEVICE = os.getenv("MODEL_DEVICE") or None
+MODEL_DTYPE = os.getenv("MODEL_DTYPE", "auto")
+
+# Quantize the linear layers of CPU models to int8 (opt-in)
+MODEL_QUANTIZE = os.getenv("MODEL_QUANTIZE", "false").lower() in ("1", "true", "yes")
+
+def configure_torch_threads() -> None:
+    """Size torch's thread pools; forward passes run one at a time on the batch scheduler threads"""
+    if TORCH_NUM_THREADS > 0:
+        torch.set_num_threads(TORCH_NUM_THREADS)
+    try:
+        # Nothing here runs inter-op parallel work, so avoid a second pool of idle threads
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set once, before any inter-op parallel work started
+        pass
+
+def warmup_models(model_manager: ModelManager) -> None:
+    """Load and warm up the preloaded models, so the first requests do not pay for it"""
+    for model_name in PRELOAD_MODELS:
+        start_time = time.time()
+        try:
+            model_manager.warmup(model_name)
+            logger.info("Warmed up model %s in %.2fs", model_name, time.time() - start_time)
+        except Exception as e:
+            logger.error("Failed to warm up model %s: %s", model_name, e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_torch_threads()
+    # The caches and model manager live for the lifetime of the app, not of the module import
+    app.state.response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE, maxbytes=RESPONSE_CACHE_MB * 1024 * 1024)
+    app.state.reduction_cache = LRUCache(maxsize=REDUCTION_CACHE_SIZE)
+    app.state.model_manager = ModelManager(
+        result_cache_size=RESULT_CACHE_SIZE,
+        result_cache_bytes=RESULT_CACHE_MB * 1024 * 1024,
+        max_batch_size=MAX_BATCH_SIZE,
+        batch_wait_timeout_s=BATCH_WAIT_TIMEOUT_MS / 1000,
+        max_tokens_per_batch=MAX_TOKENS_PER_BATCH,
+        model_options={"compile_model": TORCH_COMPILE, "device": MODEL_DEVICE, "dtype": MODEL_DTYPE, "quantize": MODEL_QUANTIZE},
+        max_models=MAX_CACHED_MODELS,
+        empty_cache_every=EMPTY_CACHE_EVERY,
+        # Responses and reductions of an unloaded model are dropped with it
+        model_caches=[app.state.response_cache, app.state.reduction_cache],
+    )
+    app.state.reduction_executor = ThreadPoolExecutor(max_workers=REDUCTION_WORKERS, thread_name_prefix="reduction")
+    # Warm up in a worker thread, so the server answers /health while models download and load;
+    # requests arriving meanwhile wait for the model they need like any first request
+    warmup = asyncio.create_task(asyncio.to_thread(warmup_models, app.state.model_manager))
+    yield
+    # Let the warmup finish, so it cannot start a batch scheduler after the shutdown
+    await warmup
+    # Stop batch scheduler and reduction worker threads on shutdown
+    app.state.model_manager.shutdown()
+    app.state.reduction_executor.shutdown()
+
 # Create FastAPI app
 app = FastAPI(
     title="Python Sidecar for Token Embeddings and Attention",
@@ -18,6 +121,8 @@ app = FastAPI(
     docs_url="/docs",  # Swagger UI
     redoc_url="/redoc",  # Redoc UI
     openapi_url="/openapi.json",  # OpenAPI JSON spec
+    default_response_class=NumpyJSONResponse,
+    lifespan=lifespan,
     contact={
         "name": "Python Sidecar Team",
         "url": "https://github.com/slawekradzyminski/python-embeddings-attention",
@@ -37,37 +142,53 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Custom middleware for request/response logging
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = str(uuid.uuid4())
+# Custom middleware for request/response logging; a plain ASGI middleware, so request
+# and response bodies stream through untouched instead of being wrapped per request
+class LoggingMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        # Assign a request id, which the logger attaches to every record of this request
+        request_id = next_request_id()
+        scope.setdefault("state", {})["request_id"] = request_id
+        token = request_id_var.set(request_id)
         
-        # Log request method and path
-        logger.info(f"Request {request_id}: {request.method} {request.url.path}")
+        # Log request method and path; bodies are never read or logged
+        logger.info("Request: %s %s", scope["method"], scope["path"])
         
         # Record request start time
-        start_time = time.time()
+        start_time = time.perf_counter()
+        
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                # Calculate and log processing time
+                process_time = time.perf_counter() - start_time
+                logger.info("Response: status=%s, time=%.4fs", message["status"], process_time)
+                
+                # Add custom headers with processing time and request id
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(process_time)
+                headers["X-Request-ID"] = request_id
+            await send(message)
         
         # Process the request
         try:
-            response = await call_next(request)
-            
-            # Calculate and log processing time
-            process_time = time.time() - start_time
-            logger.info(f"Response {request_id}: status={response.status_code}, time={process_time:.4f}s")
-            
-            # Add custom header with processing time
-            response.headers["X-Process-Time"] = str(process_time)
-            return response
-            
+            await self.app(scope, receive, send_with_headers)
         except Exception as e:
             # Log any exceptions
-            process_time = time.time() - start_time
-            logger.error(f"Error {request_id}: {str(e)}, time={process_time:.4f}s")
+            process_time = time.perf_counter() - start_time
+            logger.error("Error: %s, time=%.4fs", e, process_time)
             raise
+        finally:
+            request_id_var.reset(token)
 
 # Add logging middleware
 app.add_middleware(LoggingMiddleware)
 
 # Include router
-app.include_router(api_router) 
\ No newline at end of file
+app.include_router(api_router) 
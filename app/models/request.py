@@ -1,16 +1,22 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Literal, Optional
 
 class EmbeddingsRequest(BaseModel):
     text: str = Field(..., description="The input text to process through the model")
     model_name: Optional[str] = Field("gpt2", description="The name of the transformer model to use (default: gpt2)")
+    precision: Optional[Literal["fp32", "fp16", "int8"]] = Field(None, description="Precision of the returned embeddings: 'fp32', 'fp16' or 'int8' (quantized per token, with scale) (default: fp32, or fp16 with format=binary or raw)")
 
 class AttentionRequest(BaseModel):
     text: str = Field(..., description="The input text to process through the model")
     model_name: Optional[str] = Field("gpt2", description="The name of the transformer model to use (default: gpt2)")
+    precision: Optional[Literal["fp32", "fp16", "int8"]] = Field(None, description="Precision of the returned attention weights: 'fp32', 'fp16' or 'int8' (quantized to uint8, with scale 1/255) (default: fp32, or fp16 with format=binary or raw)")
+    head_reduction: Optional[Literal["none", "mean", "max"]] = Field("none", description="Combine the heads of every layer: 'none', 'mean' or 'max'; combined heads are returned as a single head (default: none)")
+    top_k: Optional[int] = Field(None, ge=1, description="Return only the k strongest attention weights per query token, with their key token indices in attention_indices (default: all weights)")
 
 class ReduceRequest(BaseModel):
     text: str = Field(..., description="The input text to process through the model")
     model_name: Optional[str] = Field("gpt2", description="The name of the transformer model to use (default: gpt2)")
     reduction_method: Optional[str] = Field("pca", description="Dimensionality reduction method to use: 'pca' or 'umap' (default: pca)")
-    n_components: Optional[int] = Field(2, description="Number of dimensions to reduce to, typically 2 or 3 (default: 2)") 
\ No newline at end of file
+    n_components: Optional[int] = Field(2, description="Number of dimensions to reduce to, typically 2 or 3 (default: 2)")
+    basis: Optional[Literal["text", "reference"]] = Field("text", description="'text' fits the reduction on the tokens of this text; 'reference' projects them onto a PCA basis fitted once per model on a reference corpus, which is faster and comparable across texts (pca only) (default: text)")
+    precision: Optional[Literal["fp32", "fp16", "int8"]] = Field("fp32", description="Precision of the returned reduced embeddings: 'fp32', 'fp16' or 'int8' (quantized per token, with scale) (default: fp32)")
@@ -1,26 +1,36 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional, Union
+
+class EncodedArray(BaseModel):
+    shape: List[int] = Field(..., description="Shape of the encoded array")
+    dtype: str = Field(..., description="NumPy dtype of the encoded values, e.g. float16")
+    data_b64: str = Field(..., description="Base64-encoded little-endian array bytes in C (row-major) order")
 
 class EmbeddingsResponse(BaseModel):
     tokens: List[str] = Field(..., description="List of tokens from the input text after tokenization")
-    embeddings: List[List[float]] = Field(..., description="Token embeddings (hidden states) from the model, shape: [num_tokens, embedding_dim]")
+    embeddings: Union[List[List[float]], EncodedArray] = Field(..., description="Token embeddings (hidden states) from the model, shape: [num_tokens, embedding_dim]; an encoded array when format=binary")
     model_name: str = Field(..., description="Name of the transformer model used")
+    scale: Optional[List[float]] = Field(None, description="Per-token scales of int8 embeddings (embeddings * scale[:, None] restores the values); null for other precisions")
 
 class AttentionResponse(BaseModel):
     tokens: List[str] = Field(..., description="List of tokens from the input text after tokenization")
-    attention: List[List[List[List[float]]]] = Field(..., description="Attention weights from all layers and heads, shape: [num_layers, num_heads, num_tokens, num_tokens]")
+    attention: Union[List[List[List[List[float]]]], EncodedArray] = Field(..., description="Attention weights from all layers and heads as a 4D array, shape: [num_layers, num_heads, num_tokens, num_tokens] ([..., k] when top_k is set); an encoded array when format=binary")
+    attention_indices: Optional[Union[List[List[List[List[int]]]], EncodedArray]] = Field(None, description="Key token indices of the returned weights when top_k is set, shape: [num_layers, num_heads, num_tokens, k]; null otherwise")
     model_name: str = Field(..., description="Name of the transformer model used")
+    scale: Optional[float] = Field(None, description="Scale of uint8 attention weights (1/255) when precision=int8; null for other precisions")
 
 class ReduceResponse(BaseModel):
     tokens: List[str] = Field(..., description="List of tokens from the input text after tokenization")
-    reduced_embeddings: List[List[float]] = Field(..., description="Dimensionally reduced token embeddings, shape: [num_tokens, n_components]")
+    reduced_embeddings: Union[List[List[float]], EncodedArray] = Field(..., description="Dimensionally reduced token embeddings, shape: [num_tokens, n_components]; an encoded array when format=binary")
     model_name: str = Field(..., description="Name of the transformer model used")
+    scale: Optional[List[float]] = Field(None, description="Per-token scales of int8 reduced embeddings; null for other precisions")
 
 class ModelsResponse(BaseModel):
-    models: List[str] = Field(..., description="List of available transformer models")
+    models: List[str] = Field(..., description="List of loaded transformer models, from least to most recently used")
 
 class HealthResponse(BaseModel):
     status: str = Field(..., description="Health status of the service")
+    cache: Optional[Dict[str, int]] = Field(None, description="Statistics of the model output cache: size, maxsize, hits and misses")
 
 class LogsResponse(BaseModel):
     logs: str = Field(..., description="Recent log entries from the service") 
\ No newline at end of file
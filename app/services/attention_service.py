@@ -0,0 +1,42 @@
+import numpy as np
+from typing import Tuple
+
+
+def reduce_heads(attention: np.ndarray, method: str) -> np.ndarray:
+    """
+    Combine the attention heads of every layer.
+
+    Args:
+        attention: Attention weights of shape [num_layers, num_heads, num_tokens, num_tokens]
+        method: 'none', 'mean' or 'max'
+
+    Returns:
+        Attention weights; for 'mean' and 'max' the head axis is kept with size 1
+    """
+    if method == "none":
+        return attention
+    if method == "mean":
+        return attention.mean(axis=1, keepdims=True)
+    if method == "max":
+        return attention.max(axis=1, keepdims=True)
+    raise ValueError(f"Unsupported head reduction method: {method}")
+
+
+def top_k_attention(attention: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Keep only the strongest attention weights of every query token.
+
+    Args:
+        attention: Attention weights of shape [..., num_tokens, num_tokens]
+        top_k: Number of weights to keep per query token; capped at num_tokens
+
+    Returns:
+        Tuple of (key token indices, attention weights), both of shape [..., num_tokens, k]
+        and ordered from the strongest to the weakest weight
+    """
+    k = min(top_k, attention.shape[-1])
+    # argpartition selects the top k in linear time, only those k are then sorted
+    indices = np.argpartition(attention, -k, axis=-1)[..., -k:]
+    values = np.take_along_axis(attention, indices, axis=-1)
+    order = np.argsort(-values, axis=-1, kind="stable")
+    return np.take_along_axis(indices, order, axis=-1), np.take_along_axis(values, order, axis=-1)
@@ -0,0 +1,195 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Sentinel put on the queue to stop the worker thread
+_STOP = object()
+
+# Smallest length bucket; shorter texts are grouped together
+_MIN_BUCKET = 16
+
+
+class SchedulerClosedError(RuntimeError):
+    """Raised when a request is submitted to a stopped batch scheduler"""
+
+
+def length_bucket(length: int) -> int:
+    """Round a token count up to its power-of-two length bucket"""
+    return max(_MIN_BUCKET, 1 << (length - 1).bit_length())
+
+
+class BatchScheduler:
+    def __init__(
+        self,
+        process_batch: Callable[[List[Hashable]], List[Any]],
+        max_batch_size: int = 16,
+        batch_wait_timeout_s: float = 0.01,
+        lengths_fn: Optional[Callable[[List[Hashable]], List[int]]] = None,
+        max_tokens_per_batch: int = 8192,
+    ):
+        """
+        Coalesce concurrent requests into batches processed by a single worker thread.
+
+        When lengths_fn is given, queued texts are grouped into power-of-two length
+        buckets so that short and long texts are not padded to the same length.
+        Texts may also be any other hashable request, e.g. a (text, options) tuple,
+        as long as process_batch and lengths_fn accept it.
+
+        Args:
+            process_batch: Callable taking a list of texts and returning one result per text
+            max_batch_size: Maximum number of texts collected from the queue at once
+            batch_wait_timeout_s: How long to wait for more requests before dispatching a batch
+            lengths_fn: Optional callable returning the token counts of a list of texts
+            max_tokens_per_batch: Upper bound on padded tokens (bucket length * texts) per batch
+        """
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self.lengths_fn = lengths_fn
+        self.max_tokens_per_batch = max_tokens_per_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    async def submit(self, text: Hashable) -> Any:
+        """
+        Queue text for the next batch and wait for its result.
+
+        Args:
+            text: Input text to process
+
+        Returns:
+            The result produced by process_batch for this text
+
+        Raises:
+            SchedulerClosedError: If the scheduler has been stopped
+        """
+        future: Future = Future()
+        # Queue under the lock, so the request is either ahead of the stop sentinel or rejected
+        with self._lock:
+            self._start()
+            self._queue.put((text, future))
+        return await asyncio.wrap_future(future)
+
+    def start(self) -> None:
+        """Start the worker thread if it is not already running"""
+        with self._lock:
+            self._start()
+
+    def _start(self) -> None:
+        # Called with the lock held; a stopped scheduler is never restarted
+        if self._closed:
+            raise SchedulerClosedError("Batch scheduler has been stopped")
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        """Stop the worker thread after the already queued requests are processed, and reject new ones"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._queue.put(_STOP)
+        if worker is not None:
+            worker.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch, stop = self._collect_batch(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _collect_batch(self, first: Tuple[str, Future]) -> Tuple[List[Tuple[str, Future]], bool]:
+        # Wait up to batch_wait_timeout_s for more requests to join the batch
+        batch = [first]
+        deadline = time.monotonic() + self.batch_wait_timeout_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _dispatch(self, batch: List[Tuple[str, Future]]) -> None:
+        # Skip requests whose callers have already gone away
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        for group in self._group_by_length(batch):
+            self._process(group)
+
+    def _group_by_length(self, batch: List[Tuple[str, Future]]) -> List[List[Tuple[str, Future]]]:
+        if self.lengths_fn is None or len(batch) <= 1:
+            return [batch] if batch else []
+
+        try:
+            # Count the tokens of the whole batch in one call
+            lengths = self.lengths_fn([text for text, _ in batch])
+        except Exception:
+            # Let the failure surface when each text is processed on its own
+            return [[item] for item in batch]
+
+        buckets: Dict[int, List[Tuple[str, Future]]] = {}
+        groups = []
+        for item, length in zip(batch, lengths):
+            buckets.setdefault(length_bucket(length), []).append(item)
+
+        # Split each bucket so that no batch exceeds the padded token budget
+        for bucket in sorted(buckets):
+            items = buckets[bucket]
+            per_batch = max(1, self.max_tokens_per_batch // bucket)
+            for start in range(0, len(items), per_batch):
+                groups.append(items[start:start + per_batch])
+        return groups
+
+    def _process(self, batch: List[Tuple[str, Future]]) -> None:
+        # Identical texts submitted concurrently are processed once and share the result
+        futures: Dict[str, List[Future]] = {}
+        for text, future in batch:
+            futures.setdefault(text, []).append(future)
+        texts = list(futures)
+
+        try:
+            results = self.process_batch(texts)
+        except Exception as e:
+            if len(texts) == 1:
+                self._set_exception(futures[texts[0]], e)
+                return
+            # Retry one by one so a single bad input does not fail the whole batch
+            for text in texts:
+                try:
+                    result = self.process_batch([text])[0]
+                except Exception as item_error:
+                    self._set_exception(futures[text], item_error)
+                else:
+                    self._set_result(futures[text], result)
+            return
+
+        for text, result in zip(texts, results):
+            self._set_result(futures[text], result)
+
+    @staticmethod
+    def _set_result(futures: List[Future], result: Any) -> None:
+        for future in futures:
+            future.set_result(result)
+
+    @staticmethod
+    def _set_exception(futures: List[Future], error: Exception) -> None:
+        for future in futures:
+            future.set_exception(error)
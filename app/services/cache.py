@@ -0,0 +1,87 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def hash_key(*parts: str) -> bytes:
+    """Build a compact cache key from strings using a BLAKE2 digest"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.digest()
+
+
+class LRUCache:
+    def __init__(self, maxsize: int = 1024, maxbytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        """
+        Initialize a thread-safe least-recently-used cache.
+
+        Args:
+            maxsize: Maximum number of entries kept before the oldest is evicted
+            maxbytes: Optional upper bound on the total size of the entries, as measured by sizeof;
+                values larger than the bound on their own are not stored
+            sizeof: Callable returning the size of a value in bytes (default: len)
+        """
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof or len
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        """Return the cached value for key, marking it as recently used"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store value under key, evicting the least recently used entries if full"""
+        size = self.sizeof(value) if self.maxbytes is not None else 0
+        with self._lock:
+            self._pop(key)
+            if self.maxsize <= 0 or (self.maxbytes is not None and size > self.maxbytes):
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.nbytes += size
+            while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+                self._pop(next(iter(self._data)))
+
+    def _pop(self, key: Hashable) -> None:
+        # Called with the lock held
+        if key in self._data:
+            del self._data[key]
+            self.nbytes -= self._sizes.pop(key)
+
+    def remove_if(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Remove the entries whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                self._pop(key)
+
+    def clear(self) -> None:
+        """Remove all entries and reset the statistics"""
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.nbytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        """Return the current size, capacity, and hit/miss counters"""
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "bytes": self.nbytes, "maxbytes": self.maxbytes, "hits": self.hits, "misses": self.misses}
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -1,33 +1,207 @@
-from typing import Dict, Any, Tuple, List
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import gc
+import itertools
+import threading
 import numpy as np
+import torch
 from app.services.model_service import ModelService
+from app.services.batch_scheduler import BatchScheduler, SchedulerClosedError
+from app.services.cache import LRUCache, hash_key
+from app.services.reduction_service import REFERENCE_TEXTS, ReferencePCA
+
+def result_nbytes(result: Tuple[List[str], np.ndarray, Optional[np.ndarray]]) -> int:
+    """Get the size in bytes of the arrays of a cached model output"""
+    _, hidden_states, attention = result
+    return hidden_states.nbytes + (attention.nbytes if attention is not None else 0)
 
 class ModelManager:
-    def __init__(self):
-        self.model_cache: Dict[str, ModelService] = {}
-    
+    def __init__(
+        self,
+        result_cache_size: int = 1024,
+        result_cache_bytes: Optional[int] = None,
+        max_batch_size: int = 16,
+        batch_wait_timeout_s: float = 0.01,
+        max_tokens_per_batch: int = 8192,
+        model_options: Optional[Dict[str, Any]] = None,
+        max_models: int = 4,
+        empty_cache_every: int = 0,
+        model_caches: Optional[List[LRUCache]] = None,
+    ):
+        # Loaded models from least to most recently used; the least recently used one
+        # is unloaded when more than max_models are loaded
+        self.model_cache: "OrderedDict[str, ModelService]" = OrderedDict()
+        self.max_models = max(1, max_models)
+        self.schedulers: Dict[str, BatchScheduler] = {}
+        # Model outputs keyed by (model_name, hash of text); attention is None when
+        # only the embeddings were requested. Attention grows with the square of the text
+        # length, so the cache is also bounded by the bytes of the cached arrays
+        self.result_cache = LRUCache(maxsize=result_cache_size, maxbytes=result_cache_bytes, sizeof=result_nbytes)
+        # Settings of the per-model batch schedulers
+        self.max_batch_size = max_batch_size
+        self.batch_wait_timeout_s = batch_wait_timeout_s
+        self.max_tokens_per_batch = max_tokens_per_batch
+        # Extra keyword arguments for every ModelService, e.g. compile_model
+        self.model_options = model_options or {}
+        # Other caches keyed by (model_name, ...) tuples, e.g. of serialized responses; the
+        # entries of a model are dropped together with its outputs when it is unloaded
+        self.model_caches = model_caches or []
+        # PCA bases fitted on the reference corpus, keyed by (model_name, n_components)
+        self.reference_reducers: Dict[Tuple[str, int], ReferencePCA] = {}
+        # Release cached CUDA memory every empty_cache_every batches (0 disables it), so blocks
+        # cached for earlier sequence lengths do not fragment the allocator
+        self.empty_cache_every = empty_cache_every
+        self._batch_counter = itertools.count(1)
+        # Models may be loaded from worker threads, so guard against loading one twice
+        self._lock = threading.RLock()
+
     def get_model(self, model_name: str) -> ModelService:
         """Get or initialize a model by name"""
-        if model_name not in self.model_cache:
-            self.model_cache[model_name] = ModelService(model_name)
-        return self.model_cache[model_name]
-    
-    def get_embeddings(self, text: str, model_name: str) -> Tuple[List[str], np.ndarray]:
+        # Loaded models are served without waiting on a model that is still loading
+        model = self.model_cache.get(model_name)
+        if model is not None:
+            self._touch(model_name)
+            return model
+        with self._lock:
+            if model_name not in self.model_cache:
+                self.model_cache[model_name] = ModelService(model_name, **self.model_options)
+                evicted = self._evict()
+            else:
+                evicted = []
+            model = self.model_cache[model_name]
+        # Wait for the evicted models' schedulers without holding the lock
+        self._unload(evicted)
+        return model
+
+    def _touch(self, model_name: str) -> None:
+        # move_to_end is a single atomic call, so it does not need the lock
+        try:
+            self.model_cache.move_to_end(model_name)
+        except KeyError:
+            pass
+
+    def _evict(self) -> List[Tuple[ModelService, Optional[BatchScheduler]]]:
+        # Called with the lock held; the evicted models are unloaded after releasing it
+        evicted = []
+        while len(self.model_cache) > self.max_models:
+            model_name, model = self.model_cache.popitem(last=False)
+            evicted.append((model, self.schedulers.pop(model_name, None)))
+            for key in [key for key in self.reference_reducers if key[0] == model_name]:
+                del self.reference_reducers[key]
+            for cache in [self.result_cache, *self.model_caches]:
+                cache.remove_if(lambda key: key[0] == model_name)
+        return evicted
+
+    def _unload(self, evicted: List[Tuple[ModelService, Optional[BatchScheduler]]]) -> None:
+        while evicted:
+            model, scheduler = evicted.pop()
+            # Let already queued requests finish before releasing the weights
+            if scheduler is not None:
+                scheduler.stop()
+            model.unload()
+            # Drop the last references so the weights can be freed right away
+            del model, scheduler
+            gc.collect()
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    def get_scheduler(self, model_name: str) -> BatchScheduler:
+        """Get or create the batch scheduler that runs inference for a model"""
+        while True:
+            model = self.get_model(model_name)
+            with self._lock:
+                # Another model may have been loaded since, and this one unloaded in its place
+                if self.model_cache.get(model_name) is not model:
+                    continue
+                if model_name not in self.schedulers:
+                    self.schedulers[model_name] = BatchScheduler(
+                        partial(self._process_batch, model),
+                        max_batch_size=self.max_batch_size,
+                        batch_wait_timeout_s=self.batch_wait_timeout_s,
+                        lengths_fn=lambda requests: model.count_tokens([text for text, _ in requests]),
+                        max_tokens_per_batch=self.max_tokens_per_batch,
+                    )
+                return self.schedulers[model_name]
+
+    def _process_batch(self, model: ModelService, requests: List[Tuple[str, bool]]) -> List[Tuple[List[str], np.ndarray, Optional[np.ndarray]]]:
+        # Scheduled requests are (text, need_attention) pairs; the batch shares one
+        # forward pass, so attention is computed when any request in it needs it
+        need_attention = any(need for _, need in requests)
+        try:
+            return model.get_embeddings_and_attention_batch([text for text, _ in requests], need_attention)
+        finally:
+            if self.empty_cache_every and next(self._batch_counter) % self.empty_cache_every == 0 and torch.cuda.is_available():
+                torch.cuda.empty_cache()
+
+    async def process(self, text: str, model_name: str, need_attention: bool = True) -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
+        """Get tokens, embeddings and (if needed) attention for text, reusing cached results for repeated inputs"""
+        key = (model_name, hash_key(text))
+        result = self.result_cache.get(key)
+        if result is None or (need_attention and result[2] is None):
+            scheduler = self.schedulers.get(model_name)
+            while True:
+                if scheduler is None:
+                    # Loading a model takes seconds, so keep it off the event loop
+                    scheduler = await asyncio.to_thread(self.get_scheduler, model_name)
+                else:
+                    self._touch(model_name)
+                try:
+                    result = await scheduler.submit((text, need_attention))
+                    break
+                except SchedulerClosedError:
+                    # Still the model's scheduler, so the manager has been shut down
+                    if self.schedulers.get(model_name) is scheduler:
+                        raise
+                    # The model was unloaded since its scheduler was looked up, so look
+                    # it up again under the lock, which loads the model anew
+                    scheduler = None
+            # Cached arrays are shared between requests, so guard them against mutation
+            result[1].setflags(write=False)
+            if result[2] is not None:
+                result[2].setflags(write=False)
+            self.result_cache.put(key, result)
+        return result
+
+    async def get_embeddings(self, text: str, model_name: str) -> Tuple[List[str], np.ndarray]:
         """Get tokens and embeddings for text using specified model"""
-        model = self.get_model(model_name)
-        tokens, embeddings, _ = model.get_embeddings_and_attention(text)
+        tokens, embeddings, _ = await self.process(text, model_name, need_attention=False)
         return tokens, embeddings
-    
-    def get_attention(self, text: str, model_name: str) -> Tuple[List[str], List[Any]]:
+
+    async def get_attention(self, text: str, model_name: str) -> Tuple[List[str], np.ndarray]:
         """Get tokens and attention weights for text using specified model"""
-        model = self.get_model(model_name)
-        tokens, _, attention = model.get_embeddings_and_attention(text)
+        tokens, _, attention = await self.process(text, model_name)
         return tokens, attention
-    
-    def get_embeddings_for_reduction(self, text: str, model_name: str) -> Tuple[List[str], np.ndarray]:
+
+    async def get_embeddings_for_reduction(self, text: str, model_name: str) -> Tuple[List[str], np.ndarray]:
         """Get tokens and embeddings for dimensionality reduction"""
-        return self.get_embeddings(text, model_name)
-    
+        return await self.get_embeddings(text, model_name)
+
+    async def get_reference_reducer(self, model_name: str, n_components: int) -> ReferencePCA:
+        """Get the PCA reducer fitted on the reference corpus embeddings of a model"""
+        key = (model_name, n_components)
+        if key not in self.reference_reducers:
+            results = await asyncio.gather(*(self.get_embeddings(text, model_name) for text in REFERENCE_TEXTS))
+            reference_embeddings = np.concatenate([embeddings for _, embeddings in results])
+            reducer = await asyncio.to_thread(ReferencePCA(n_components).fit, reference_embeddings)
+            self.reference_reducers[key] = reducer
+        return self.reference_reducers[key]
+
+    def warmup(self, model_name: str) -> None:
+        """Load a model and run a dummy forward pass so the first request does not pay for it"""
+        self.get_model(model_name).get_embeddings_and_attention("warmup")
+        self.get_scheduler(model_name).start()
+
     def list_models(self) -> List[str]:
-        """List all available models"""
-        return list(self.model_cache.keys()) 
\ No newline at end of file
+        """List all available models, from least to most recently used"""
+        return list(self.model_cache.keys())
+
+    def cache_stats(self) -> Dict[str, int]:
+        """Get statistics of the model output cache"""
+        return self.result_cache.stats()
+
+    def shutdown(self) -> None:
+        """Stop all batch scheduler worker threads"""
+        for scheduler in self.schedulers.values():
+            scheduler.stop()
@@ -1,62 +1,335 @@
+import logging
 import torch
 from transformers import AutoModel, AutoTokenizer
+from transformers.pytorch_utils import Conv1D
 import numpy as np
-from typing import List, Tuple, Any, Dict, Optional
+from typing import List, Tuple, Any, Dict, Optional, Set
 
-# Global caches to avoid reloading models and tokenizers
-_MODEL_CACHE: Dict[str, Any] = {}
+from app.services.batch_scheduler import length_bucket
+from app.services.cache import LRUCache
+
+# Records go to the application logger set up in app.core.logging_config
+logger = logging.getLogger("api")
+
+# Global caches to avoid reloading models and tokenizers; models are keyed by their load options
+_MODEL_CACHE: Dict[Tuple[str, str, torch.dtype, bool, bool], Any] = {}
 _TOKENIZER_CACHE: Dict[str, Any] = {}
 
+# Supported values of the dtype option
+_DTYPES = {"float32": torch.float32, "float16": torch.float16, "bfloat16": torch.bfloat16}
+
+# Input length limits at or above this are placeholders for "no limit" (tokenizers report 1e30)
+_NO_LENGTH_LIMIT = 1 << 31
+
+# Largest batch output (in float32 elements, 256 MB) copied to the host through a reused pinned buffer
+_STAGING_MAX_ELEMENTS = 1 << 26
+
+def _replace_conv1d_with_linear(module: torch.nn.Module) -> None:
+    """Replace Conv1D layers, which store transposed weights, with equivalent linear layers in place"""
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            linear = torch.nn.Linear(child.weight.shape[0], child.nf, dtype=child.weight.dtype, device=child.weight.device)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _replace_conv1d_with_linear(child)
+
 class ModelService:
-    def __init__(self, model_name: str = "gpt2"):
+    def __init__(
+        self,
+        model_name: str = "gpt2",
+        compile_model: bool = False,
+        device: Optional[str] = None,
+        dtype: str = "auto",
+        quantize: bool = False,
+    ):
         """
         Initialize the model service with a specified model.
         
         Args:
             model_name: Name of the Hugging Face model to use
+            compile_model: Whether to compile the forward pass with torch.compile
+            device: Device to run the model on (default: cuda if available, otherwise cpu)
+            dtype: 'float32', 'float16', 'bfloat16' or 'auto' (bfloat16 on cuda where supported,
+                otherwise float16 on cuda and float32 on cpu)
+            quantize: Whether to quantize the linear layers to int8 (float32 on cpu only)
         """
         self.model_name = model_name
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        if dtype == "auto":
+            dtype = self._auto_dtype()
+        if dtype not in _DTYPES:
+            raise ValueError(f"Unsupported model dtype: {dtype}")
+        self.dtype = _DTYPES[dtype]
         
-        # Use cached tokenizer if available
+        # Use cached tokenizer if available; only the Rust-backed fast tokenizers are supported
         if model_name not in _TOKENIZER_CACHE:
-            _TOKENIZER_CACHE[model_name] = AutoTokenizer.from_pretrained(model_name)
+            tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+            if not tokenizer.is_fast:
+                raise ValueError(f"No fast tokenizer available for model {model_name}")
+            _TOKENIZER_CACHE[model_name] = tokenizer
         self.tokenizer = _TOKENIZER_CACHE[model_name]
+        # Batched requests are right-padded so real tokens keep their positions
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "right"
+        # Encodings of recently seen texts, so a text is not tokenized again for its forward pass
+        self.encodings = LRUCache(maxsize=1024)
+        # Padding cached encodings with pad() is intended, so skip the advice to call the tokenizer instead
+        self.tokenizer.deprecation_warnings["Asking-to-pad-a-fast-tokenizer"] = True
+        # Compiled GPU models replay CUDA graphs, which are captured once per input shape, so
+        # batches are padded to power-of-two lengths to keep the number of shapes small
+        self.static_shapes = compile_model and self.device.startswith("cuda")
+        # Pinned host buffers reused for copying batch outputs off the GPU, keyed by output name
+        self._staging: Dict[str, torch.Tensor] = {}
+        # Padded (batch_size, seq_len) input shapes the compiled model has already seen
+        self.compiled_shapes: Set[Tuple[int, int]] = set()
         
-        # Use cached model if available
-        if model_name not in _MODEL_CACHE:
-            _MODEL_CACHE[model_name] = AutoModel.from_pretrained(model_name, output_attentions=True)
-            _MODEL_CACHE[model_name].eval()  # Set to evaluation mode
-        self.model = _MODEL_CACHE[model_name]
+        # Use cached model if available, unless it was loaded with other options
+        self.model_key = (model_name, self.device, self.dtype, compile_model, quantize)
+        if self.model_key not in _MODEL_CACHE:
+            # Attention outputs are requested per forward pass, so embeddings-only passes
+            # neither keep the attention tensors nor force the eager attention implementation
+            model = AutoModel.from_pretrained(model_name, torch_dtype=self.dtype)
+            model.to(self.device)
+            model.eval()  # Set to evaluation mode
+            if quantize:
+                model = self._quantize(model)
+            _MODEL_CACHE[self.model_key] = self._compile(model) if compile_model else model
+        self.model = _MODEL_CACHE[self.model_key]
+        
+        # Longest input the model accepts: the tokenizer's limit, capped by the model's position
+        # table; tokenizers without a known limit report a huge placeholder, which is ignored
+        positions = getattr(getattr(self.model, "config", None), "max_position_embeddings", None)
+        limits = [limit for limit in (self.tokenizer.model_max_length, positions) if isinstance(limit, int) and limit < _NO_LENGTH_LIMIT]
+        self.max_length: Optional[int] = min(limits) if limits else None
+    
+    def _auto_dtype(self) -> str:
+        """Pick the fastest dtype for the device; bfloat16 keeps float32's range, so attention scores cannot overflow"""
+        if not self.device.startswith("cuda"):
+            return "float32"
+        with torch.cuda.device(self.device):
+            return "bfloat16" if torch.cuda.is_bf16_supported() else "float16"
     
-    def get_embeddings_and_attention(self, text: str) -> Tuple[List[str], np.ndarray, List[Any]]:
+    def unload(self) -> None:
+        """Remove the model and tokenizer from the global caches, so they are freed once unreferenced"""
+        _MODEL_CACHE.pop(self.model_key, None)
+        _TOKENIZER_CACHE.pop(self.model_name, None)
+    
+    def _quantize(self, model: Any) -> Any:
+        """
+        Quantize the linear layers of the model to int8 with dynamic quantization.
+        
+        Weights are stored as int8 and activations are quantized on the fly, which
+        speeds up CPU inference at a small cost in accuracy. GPT-2 style Conv1D layers
+        are converted to equivalent linear layers first so that they are quantized too.
+        
+        Args:
+            model: Model in evaluation mode
+            
+        Returns:
+            The quantized model, or the original model if it cannot be quantized
+        """
+        if self.device != "cpu" or self.dtype != torch.float32:
+            logger.warning("int8 quantization needs a float32 model on cpu, not quantizing model %s", self.model_name)
+            return model
+        try:
+            _replace_conv1d_with_linear(model)
+            return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        except Exception as e:
+            logger.warning("int8 quantization failed for model %s, using float32: %s", self.model_name, e)
+            return model
+    
+    def _compile(self, model: Any) -> Any:
+        """
+        Compile the model with torch.compile, falling back to eager mode if that fails.
+        
+        Compilation is lazy, so a dummy forward pass triggers it here rather than on
+        the first request. Compiled kernels are cached on disk by Inductor (see
+        TORCHINDUCTOR_CACHE_DIR), so restarts do not pay the full compile cost again.
+        
+        On CUDA the model is compiled for static shapes in reduce-overhead mode, which
+        captures the forward pass of each padded batch shape in a CUDA graph and
+        replays it without per-kernel launch overhead.
+        
+        Args:
+            model: Model in evaluation mode
+            
+        Returns:
+            The compiled model, or the original model if it cannot be compiled
+        """
+        try:
+            if self.static_shapes:
+                compiled = torch.compile(model, mode="reduce-overhead", dynamic=False)
+            else:
+                compiled = torch.compile(model, dynamic=True)
+            # Passes with and without attention outputs are separate graphs, so compile both
+            inputs = self.tokenizer("Hello world", return_tensors="pt").to(self.device)
+            with torch.inference_mode():
+                for need_attention in (True, False):
+                    compiled(**inputs, output_attentions=need_attention)
+            return compiled
+        except Exception as e:
+            logger.warning("torch.compile failed for model %s, using eager mode: %s", self.model_name, e)
+            return model
+
+    def get_embeddings_and_attention(self, text: str, need_attention: bool = True) -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
         """
         Process text through the model and return tokens, embeddings, and attention.
         
         Args:
             text: Input text to process
+            need_attention: Whether to return attention weights; without them the model
+                does not keep the per-layer attention tensors
             
         Returns:
             Tuple containing:
             - List of token strings
             - NumPy array of token embeddings
-            - List of attention matrices
+            - NumPy array of attention weights, shape [num_layers, num_heads, num_tokens, num_tokens],
+              or None when need_attention is False
         """
-        # Tokenize
-        inputs = self.tokenizer(text, return_tensors="pt")
+        # Tokenize, reusing the encoding of a recently seen text
+        encoding = self.encode([text])[0]
+        inputs = {key: torch.tensor([values], device=self.device) for key, values in encoding.items() if key != "tokens"}
         
         # Run model inference
-        with torch.no_grad():
-            outputs = self.model(**inputs, output_attentions=True)
+        with torch.inference_mode():
+            outputs = self.model(**inputs, output_attentions=need_attention)
         
-        # Get token embeddings (last hidden state)
-        hidden_states = outputs.last_hidden_state[0].cpu().numpy()  # Remove batch dimension
+        # Get token embeddings (last hidden state), returned as float32 whatever the model dtype
+        hidden_states = outputs.last_hidden_state[0].float().cpu().numpy()  # Remove batch dimension
         
         # Get attention weights
-        # Format: list of tensors, one per layer, each with shape [batch_size, num_heads, seq_len, seq_len]
-        attentions = [layer[0].cpu().numpy().tolist() for layer in outputs.attentions]  # Remove batch dimension
+        # Format: tuple of tensors, one per layer, each with shape [batch_size, num_heads, seq_len, seq_len],
+        # stacked on the device and copied once into a contiguous [num_layers, num_heads, seq_len, seq_len] array
+        attentions = torch.stack(outputs.attentions)[:, 0].float().cpu().numpy() if need_attention else None  # Remove batch dimension
         
-        # Get token strings
-        token_ids = inputs.input_ids[0].tolist()
-        tokens = self.tokenizer.convert_ids_to_tokens(token_ids)
+        # Token strings come with the cached encoding
+        tokens = list(encoding["tokens"])
         
         return tokens, hidden_states, attentions
+
+    def _to_host(self, name: str, tensor: torch.Tensor) -> np.ndarray:
+        """
+        Copy a batch output to the host as float32.
+
+        On CUDA the copy goes through a pinned buffer that is reused across batches,
+        which is faster than copying into freshly allocated pageable memory. The
+        returned array is only valid until the next batch.
+
+        Args:
+            name: Name of the output, selecting its staging buffer
+            tensor: Output tensor on the model device
+
+        Returns:
+            The output as a float32 NumPy array
+        """
+        if not self.device.startswith("cuda") or tensor.numel() > _STAGING_MAX_ELEMENTS:
+            return tensor.float().cpu().numpy()
+
+        buffer = self._staging.get(name)
+        if buffer is None or buffer.numel() < tensor.numel():
+            # Grow geometrically so that slowly growing batches do not reallocate every time
+            size = min(_STAGING_MAX_ELEMENTS, max(tensor.numel(), 2 * (buffer.numel() if buffer is not None else 0)))
+            buffer = self._staging[name] = torch.empty(size, dtype=torch.float32, pin_memory=True)
+        staged = buffer[:tensor.numel()].view(tensor.shape)
+        staged.copy_(tensor, non_blocking=True)
+        torch.cuda.current_stream(tensor.device).synchronize()
+        return staged.numpy()
+
+    def encode(self, texts: List[str]) -> List[Dict[str, Tuple[int, ...]]]:
+        """
+        Get the unpadded encodings of several texts, tokenizing the uncached ones with a single call.
+
+        Args:
+            texts: Input texts to tokenize
+
+        Returns:
+            List with one encoding per text, mapping model input names (input_ids,
+            attention_mask, ...) and "tokens", the token strings, to immutable tuples;
+            treat them as read-only
+        """
+        encodings = [self.encodings.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, encoding in zip(texts, encodings) if encoding is None))
+        if missing:
+            # Texts longer than the model accepts are truncated, so the forward pass and
+            # the length buckets never go past its position table
+            batch = self.tokenizer(missing, padding=False, truncation=self.max_length is not None, max_length=self.max_length)
+            # Fast tokenizers also return the token strings, so ids need not be converted back
+            new_encodings = {
+                text: {**{key: tuple(values[i]) for key, values in batch.items()}, "tokens": tuple(batch.tokens(i))}
+                for i, text in enumerate(missing)
+            }
+            for text, encoding in new_encodings.items():
+                self.encodings.put(text, encoding)
+            encodings = [encoding or new_encodings[text] for text, encoding in zip(texts, encodings)]
+        return encodings
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """
+        Count the tokens of several texts.
+
+        Args:
+            texts: Input texts to count tokens for
+
+        Returns:
+            List with the number of tokens of each text
+        """
+        return [len(encoding["input_ids"]) for encoding in self.encode(texts)]
+
+    def get_embeddings_and_attention_batch(self, texts: List[str], need_attention: bool = True) -> List[Tuple[List[str], np.ndarray, Optional[np.ndarray]]]:
+        """
+        Process several texts in a single padded forward pass.
+
+        Args:
+            texts: Input texts to process
+            need_attention: Whether to return attention weights
+
+        Returns:
+            List with one (tokens, embeddings, attention) tuple per input text,
+            trimmed back to the text's own length; attention is None when
+            need_attention is False
+        """
+        if len(texts) == 1 and not self.static_shapes:
+            return [self.get_embeddings_and_attention(texts[0], need_attention)]
+
+        # Pad the (usually already cached) token ids of all texts to the longest one,
+        # or to its length bucket when the model runs with static shapes
+        encodings = self.encode(texts)
+        encoded = [{key: list(values) for key, values in encoding.items() if key != "tokens"} for encoding in encodings]
+        if self.static_shapes:
+            longest = max(len(encoding["input_ids"]) for encoding in encoded)
+            bucket = length_bucket(longest)
+            padded_length = max(longest, min(bucket, self.max_length) if self.max_length else bucket)
+            inputs = self.tokenizer.pad(encoded, padding="max_length", max_length=padded_length, return_tensors="pt")
+            shape = tuple(inputs["input_ids"].shape)
+            if shape not in self.compiled_shapes:
+                # The first batch of every shape is compiled and captured, which takes a while
+                self.compiled_shapes.add(shape)
+                logger.info("Compiling model %s for input shape %s", self.model_name, shape)
+        else:
+            inputs = self.tokenizer.pad(encoded, padding=True, return_tensors="pt")
+        # The padded ids are a few KB, so a plain copy is cheaper than pinning new host memory per batch
+        inputs = inputs.to(self.device)
+
+        # Run model inference once for the whole batch
+        with torch.inference_mode():
+            outputs = self.model(**inputs, output_attentions=need_attention)
+
+        # Copy the whole batch to the host once: attention as one
+        # [batch_size, num_layers, num_heads, seq_len, seq_len] array, plus hidden states and lengths
+        batch_attentions = self._to_host("attention", torch.stack(outputs.attentions, dim=1)) if need_attention else None
+        batch_hidden_states = self._to_host("hidden_states", outputs.last_hidden_state)
+        lengths = [len(encoding["input_ids"]) for encoding in encodings]
+
+        results = []
+        for i, length in enumerate(lengths):
+            # Batches are right-padded, so the real tokens are the first `length` positions;
+            # each result is copied out, as the batch arrays may be reused staging buffers
+            hidden_states = batch_hidden_states[i, :length].copy()
+            attentions = batch_attentions[i, :, :, :length, :length].copy() if need_attention else None
+            results.append((list(encodings[i]["tokens"]), hidden_states, attentions))
+
+        return results
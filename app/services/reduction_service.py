@@ -1,9 +1,116 @@
 import numpy as np
-from typing import Optional
-from sklearn.preprocessing import StandardScaler, MinMaxScaler
+from typing import List, Optional, Tuple
+from scipy.linalg import eigh
 from sklearn.decomposition import PCA
 from umap import UMAP
 
+# Reference corpus the per-model PCA basis is fitted on
+REFERENCE_TEXTS: List[str] = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Transformers process all tokens of a sequence in parallel using self-attention.",
+    "She opened the window and the cold morning air filled the room.",
+    "The central bank raised interest rates to slow down inflation.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "He scored the winning goal in the final minute of the match.",
+    "Please restart the server after updating the configuration file.",
+    "The museum displays paintings from the seventeenth century.",
+    "Heavy rain is expected across the north of the country tomorrow.",
+    "Mix the flour, sugar and eggs, then bake for thirty minutes.",
+    "The committee will publish its recommendations next month.",
+    "Why do cats purr when they are happy?",
+]
+
+# Largest Gram/covariance matrix size for which pca_project uses an eigendecomposition
+_EIGH_MAX_SIZE = 256
+
+def standardize(embeddings: np.ndarray) -> np.ndarray:
+    """
+    Scale every feature to zero mean and unit variance, like StandardScaler().fit_transform.
+    
+    Works on a single new array (the input may be a read-only cached array) instead of
+    going through the scaler's validation and copies.
+    
+    Args:
+        embeddings: Token embeddings of shape [num_tokens, hidden_dim]
+        
+    Returns:
+        Standardized embeddings; constant features are only centered
+    """
+    mean, std = feature_moments(embeddings)
+    standardized = np.subtract(embeddings, mean)
+    np.divide(standardized, std, out=standardized)
+    return standardized
+
+def feature_moments(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Get the per-feature mean and standard deviation used to standardize embeddings.
+    
+    Args:
+        embeddings: Token embeddings of shape [num_tokens, hidden_dim]
+        
+    Returns:
+        Tuple of (mean, std); the std of constant features is 1, as in StandardScaler
+    """
+    mean = embeddings.mean(axis=0)
+    std = embeddings.std(axis=0)
+    std[std == 0] = 1.0
+    return mean, std
+
+def pca_project(embeddings: np.ndarray, n_components: int) -> np.ndarray:
+    """
+    Project embeddings onto their first principal components, like PCA(n_components).fit_transform.
+    
+    For short texts the components are the top eigenvectors of the smaller of the
+    [num_tokens, num_tokens] Gram matrix and the [hidden_dim, hidden_dim] covariance
+    matrix, which is much cheaper than going through PCA's solver; long texts use
+    PCA's randomized SVD, seeded so that repeated requests get the same result.
+    
+    Args:
+        embeddings: Token embeddings of shape [num_tokens, hidden_dim]
+        n_components: Number of components to keep
+        
+    Returns:
+        Principal component scores of shape [num_tokens, n_components]; the sign of each
+        component is chosen so that its largest absolute score is positive
+    """
+    num_tokens, hidden_dim = embeddings.shape
+    size = min(num_tokens, hidden_dim)
+    if size > _EIGH_MAX_SIZE:
+        scores = PCA(n_components=n_components, svd_solver="randomized", random_state=0).fit_transform(embeddings)
+    else:
+        centered = embeddings - embeddings.mean(axis=0)
+        gram = centered @ centered.T if num_tokens <= hidden_dim else centered.T @ centered
+        # Only compute the largest eigenpairs, which eigh returns in ascending order
+        eigenvalues, eigenvectors = eigh(gram, subset_by_index=[size - n_components, size - 1], driver="evr")
+        eigenvalues, eigenvectors = eigenvalues[::-1], eigenvectors[:, ::-1]
+        if num_tokens <= hidden_dim:
+            scores = eigenvectors * np.sqrt(np.clip(eigenvalues, 0.0, None))
+        else:
+            scores = centered @ eigenvectors
+    
+    # Eigenvectors are only defined up to sign, so fix it for stable plots
+    signs = np.sign(scores[np.abs(scores).argmax(axis=0), np.arange(scores.shape[1])])
+    signs[signs == 0] = 1.0
+    return scores * signs
+
+def scale_to_unit_range(reduced: np.ndarray) -> np.ndarray:
+    """
+    Scale every component to the range [-1, 1], like MinMaxScaler(feature_range=(-1, 1)).fit_transform.
+    
+    Args:
+        reduced: Reduced embeddings of shape [num_tokens, n_components]; overwritten in place
+        
+    Returns:
+        The scaled embeddings; constant components become -1
+    """
+    minimum = reduced.min(axis=0)
+    value_range = reduced.max(axis=0) - minimum
+    value_range[value_range == 0] = 1.0
+    reduced -= minimum
+    reduced *= 2.0 / value_range
+    reduced -= 1.0
+    return reduced
+
 class DimensionalityReducer:
     def __init__(self, method: str = "pca", n_components: int = 2):
         """
@@ -32,13 +139,11 @@ class DimensionalityReducer:
             raise ValueError(f"Cannot reduce {seq_len} tokens to {self.n_components} dimensions. Not enough tokens.")
 
         # Standardize embeddings (zero mean, unit variance)
-        scaler = StandardScaler()
-        embeddings_normalized = scaler.fit_transform(embeddings)
+        embeddings_normalized = standardize(embeddings)
 
         # Apply PCA or UMAP
         if self.method == "pca":
-            reducer = PCA(n_components=self.n_components)
-            reduced = reducer.fit_transform(embeddings_normalized)
+            reduced = pca_project(embeddings_normalized, self.n_components)
         elif self.method == "umap":
             reducer = UMAP(n_components=self.n_components)
             reduced = reducer.fit_transform(embeddings_normalized)
@@ -46,7 +151,50 @@ class DimensionalityReducer:
             raise ValueError(f"Unsupported dimensionality reduction method: {self.method}")
         
         # Normalize the reduced embeddings to range [-1, 1]
-        normalizer = MinMaxScaler(feature_range=(-1, 1))
-        reduced = normalizer.fit_transform(reduced)
+        return scale_to_unit_range(reduced)
+
 
-        return reduced 
\ No newline at end of file
+class ReferencePCA:
+    def __init__(self, n_components: int = 2):
+        """
+        Initialize a PCA reducer whose basis is fitted once on reference embeddings.
+        
+        Unlike DimensionalityReducer, which fits afresh on every text, all texts are
+        projected onto the same axes, so requests only pay for a matrix product.
+        
+        Args:
+            n_components: Number of dimensions to reduce to
+        """
+        self.n_components = n_components
+        self.mean: Optional[np.ndarray] = None
+        self.std: Optional[np.ndarray] = None
+        self.pca = PCA(n_components=n_components)
+    
+    def fit(self, reference_embeddings: np.ndarray) -> "ReferencePCA":
+        """
+        Fit the standardization and PCA basis.
+        
+        Args:
+            reference_embeddings: Token embeddings of the reference corpus, shape [num_tokens, hidden_dim]
+            
+        Returns:
+            The fitted reducer
+        """
+        self.mean, self.std = feature_moments(reference_embeddings)
+        self.pca.fit((reference_embeddings - self.mean) / self.std)
+        return self
+    
+    def reduce(self, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Project embeddings onto the fitted basis for visualization.
+        
+        Args:
+            embeddings: Token embeddings to reduce
+            
+        Returns:
+            Reduced embeddings as NumPy array, normalized to range [-1, 1]
+        """
+        reduced = self.pca.transform((embeddings - self.mean) / self.std)
+        
+        # Normalize the reduced embeddings to range [-1, 1]
+        return scale_to_unit_range(reduced)
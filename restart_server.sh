@@ -6,7 +6,7 @@ pkill -f uvicorn || echo "No uvicorn processes found"
 
 # Start the server in the background
 echo "Starting server on port 5000..."
-uvicorn app.main:app --host 0.0.0.0 --port 5000 --reload &
+uvicorn app.main:app --host 0.0.0.0 --port 5000 --loop uvloop --http httptools --reload &
 SERVER_PID=$!
 
 # Wait for server to start (max 30 seconds)
@@ -1,5 +1,55 @@
 import os
 import sys
+import numpy as np
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
 
 # Add the project root directory to the Python path
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) 
\ No newline at end of file
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))) 
+
+# Do not load real models when the app starts up during tests
+os.environ.setdefault("PRELOAD_MODELS", "")
+
+# Keep the functions Numba compiles for UMAP on disk, so later runs of the slow tests skip the JIT
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", ".cache", "numba"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client shared by all tests, so the app lifespan and its model manager start once"""
+    from app.main import app
+
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture(scope="session", autouse=True)
+def mock_model_service():
+    """Serve every model the app loads with MockModelService, patched once for the whole session"""
+    from tests.mock_model_service import MockModelService
+
+    with patch("app.services.model_manager.ModelService", MockModelService):
+        yield
+
+
+@pytest.fixture(scope="session")
+def rng():
+    """Seeded random generator shared by the tests"""
+    return np.random.default_rng(0)
+
+
+@pytest.fixture(scope="session")
+def embeddings_10x768(rng):
+    """Read-only float32 embeddings of 10 tokens, like the cached model outputs passed to reducers"""
+    embeddings = rng.standard_normal((10, 768), dtype=np.float32)
+    embeddings.setflags(write=False)
+    return embeddings
+
+
+@pytest.fixture(scope="session")
+def embeddings_2x768(rng):
+    """Read-only float32 embeddings of 2 tokens"""
+    embeddings = rng.standard_normal((2, 768), dtype=np.float32)
+    embeddings.setflags(write=False)
+    return embeddings
@@ -1,5 +1,23 @@
 import numpy as np
-from typing import List, Tuple, Any
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+# Seeded generator for the mock outputs, so test runs are reproducible
+_RNG = np.random.default_rng(0)
+
+
+@lru_cache(maxsize=128)
+def _mock_outputs(text: str, num_tokens: int) -> Tuple[np.ndarray, np.ndarray]:
+    # Repeated texts reuse their outputs, which are therefore read-only,
+    # like the results cached by ModelManager
+    embedding_dim = 16  # Small dimension for testing
+    num_layers = 2
+    num_heads = 4
+    embeddings = _RNG.standard_normal((num_tokens, embedding_dim), dtype=np.float32)
+    attentions = _RNG.random((num_layers, num_heads, num_tokens, num_tokens), dtype=np.float32)
+    embeddings.setflags(write=False)
+    attentions.setflags(write=False)
+    return embeddings, attentions
 
 
 class MockModelService:
@@ -7,19 +25,19 @@ class MockModelService:
     Mock implementation of ModelService for testing without loading actual models.
     """
     
-    def __init__(self, model_name: str = "mock-gpt2"):
+    def __init__(self, model_name: str = "mock-gpt2", **options):
         self.model_name = model_name
+        self.options = options
     
-    def get_embeddings_and_attention(self, text: str) -> Tuple[List[str], np.ndarray, List[Any]]:
-        """
-        Return mock tokens, embeddings, and attention for the given text.
-        
-        Args:
-            text: Input text
-            
-        Returns:
-            Mock tokens, embeddings, and attention
-        """
+    def unload(self) -> None:
+        """Mock models hold no global state"""
+        self.unloaded = True
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Return the number of mock tokens each text is split into"""
+        return [len(self._tokenize(text)) for text in texts]
+    
+    def _tokenize(self, text: str) -> List[str]:
         # Split text into mock tokens
         words = text.split()
         tokens = []
@@ -29,18 +47,35 @@ class MockModelService:
                 tokens.extend([word[:3], word[3:]])
             else:
                 tokens.append(word)
+        return tokens
+    
+    def get_embeddings_and_attention(self, text: str, need_attention: bool = True) -> Tuple[List[str], np.ndarray, Optional[np.ndarray]]:
+        """
+        Return mock tokens, embeddings, and attention for the given text.
         
-        # Create mock embeddings (random values)
-        embedding_dim = 16  # Small dimension for testing
-        embeddings = np.random.randn(len(tokens), embedding_dim).astype(np.float32)
+        Args:
+            text: Input text
+            need_attention: Whether to return mock attention
+            
+        Returns:
+            Mock tokens, embeddings, and attention
+        """
+        tokens = self._tokenize(text)
         
-        # Create mock attention (random values)
-        num_layers = 2
-        num_heads = 4
-        attentions = []
+        # Random embeddings and attention, generated once per text
+        embeddings, attentions = _mock_outputs(text, len(tokens))
         
-        for _ in range(num_layers):
-            layer_attention = np.random.rand(num_heads, len(tokens), len(tokens)).tolist()
-            attentions.append(layer_attention)
+        return tokens, embeddings, attentions if need_attention else None
+    
+    def get_embeddings_and_attention_batch(self, texts: List[str], need_attention: bool = True) -> List[Tuple[List[str], np.ndarray, Optional[np.ndarray]]]:
+        """
+        Return mock tokens, embeddings, and attention for each of the given texts.
         
-        return tokens, embeddings, attentions 
\ No newline at end of file
+        Args:
+            texts: Input texts
+            need_attention: Whether to return mock attention
+            
+        Returns:
+            List of mock tokens, embeddings, and attention tuples
+        """
+        return [self.get_embeddings_and_attention(text, need_attention) for text in texts]
@@ -1,5 +1,7 @@
 import numpy as np
-from typing import Optional
+
+# Seeded generator shared by all mock reducers, so mock outputs are reproducible
+_RNG = np.random.default_rng(0)
 
 class MockDimensionalityReducer:
     """
@@ -30,4 +32,4 @@ class MockDimensionalityReducer:
             raise ValueError(f"Unsupported dimensionality reduction method: {self.method}")
             
         # Return random values in the range [-1, 1]
-        return np.random.uniform(-1, 1, (seq_len, self.n_components)).astype(np.float32) 
\ No newline at end of file
+        return _RNG.uniform(-1, 1, (seq_len, self.n_components)).astype(np.float32) 
\ No newline at end of file
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from app.services.attention_service import reduce_heads, top_k_attention
+
+
+class TestAttentionService:
+    def test_reduce_heads_keeps_a_single_head(self, rng):
+        # given
+        attention = rng.random((2, 4, 3, 3), dtype=np.float32)
+
+        # when
+        mean = reduce_heads(attention, "mean")
+        maximum = reduce_heads(attention, "max")
+
+        # then
+        assert mean.shape == (2, 1, 3, 3)
+        np.testing.assert_allclose(mean[:, 0], attention.mean(axis=1))
+        np.testing.assert_allclose(maximum[:, 0], attention.max(axis=1))
+        assert reduce_heads(attention, "none") is attention
+
+    def test_reduce_heads_rejects_unknown_method(self):
+        # given / when / then
+        with pytest.raises(ValueError):
+            reduce_heads(np.zeros((1, 1, 1, 1)), "median")
+
+    def test_top_k_returns_strongest_weights_in_order(self):
+        # given
+        attention = np.array([[[[0.1, 0.6, 0.3], [0.5, 0.2, 0.3]]]])
+
+        # when
+        indices, values = top_k_attention(attention, 2)
+
+        # then
+        assert indices.tolist() == [[[[1, 2], [0, 2]]]]
+        np.testing.assert_allclose(values, [[[[0.6, 0.3], [0.5, 0.3]]]])
+
+    def test_top_k_is_capped_at_sequence_length(self, rng):
+        # given
+        attention = rng.random((1, 1, 2, 2), dtype=np.float32)
+
+        # when
+        indices, values = top_k_attention(attention, 8)
+
+        # then
+        assert indices.shape == values.shape == (1, 1, 2, 2)
@@ -0,0 +1,131 @@
+import asyncio
+import pytest
+
+from app.services.batch_scheduler import BatchScheduler, SchedulerClosedError, length_bucket
+
+
+class TestBatchScheduler:
+    def test_concurrent_requests_share_a_batch(self):
+        # given
+        batches = []
+
+        def process_batch(texts):
+            batches.append(list(texts))
+            return [text.upper() for text in texts]
+
+        scheduler = BatchScheduler(process_batch, max_batch_size=8, batch_wait_timeout_s=0.05)
+
+        async def submit_all():
+            return await asyncio.gather(*(scheduler.submit(text) for text in ["a", "b", "c"]))
+
+        # when
+        results = asyncio.run(submit_all())
+        scheduler.stop()
+
+        # then
+        assert results == ["A", "B", "C"]
+        assert batches == [["a", "b", "c"]]
+
+    def test_batch_size_is_capped(self):
+        # given
+        batches = []
+
+        def process_batch(texts):
+            batches.append(list(texts))
+            return texts
+
+        scheduler = BatchScheduler(process_batch, max_batch_size=2, batch_wait_timeout_s=0.05)
+
+        async def submit_all():
+            return await asyncio.gather(*(scheduler.submit(text) for text in ["a", "b", "c"]))
+
+        # when
+        results = asyncio.run(submit_all())
+        scheduler.stop()
+
+        # then
+        assert results == ["a", "b", "c"]
+        assert all(len(batch) <= 2 for batch in batches)
+
+    def test_failing_input_does_not_fail_the_batch(self):
+        # given
+        def process_batch(texts):
+            if "bad" in texts:
+                raise ValueError("bad input")
+            return texts
+
+        scheduler = BatchScheduler(process_batch, max_batch_size=8, batch_wait_timeout_s=0.05)
+
+        async def submit_all():
+            return await asyncio.gather(scheduler.submit("good"), scheduler.submit("bad"), return_exceptions=True)
+
+        # when
+        good, bad = asyncio.run(submit_all())
+        scheduler.stop()
+
+        # then
+        assert good == "good"
+        assert isinstance(bad, ValueError)
+
+    def test_identical_texts_are_processed_once(self):
+        # given
+        batches = []
+
+        def process_batch(texts):
+            batches.append(list(texts))
+            return [text.upper() for text in texts]
+
+        scheduler = BatchScheduler(process_batch, max_batch_size=8, batch_wait_timeout_s=0.05)
+
+        async def submit_all():
+            return await asyncio.gather(*(scheduler.submit(text) for text in ["a", "b", "a", "a"]))
+
+        # when
+        results = asyncio.run(submit_all())
+        scheduler.stop()
+
+        # then
+        assert results == ["A", "B", "A", "A"]
+        assert batches == [["a", "b"]]
+
+    def test_texts_are_grouped_by_length_bucket(self):
+        # given
+        batches = []
+
+        def process_batch(texts):
+            batches.append(sorted(texts))
+            return texts
+
+        scheduler = BatchScheduler(process_batch, max_batch_size=8, batch_wait_timeout_s=0.05, lengths_fn=lambda texts: [len(text) for text in texts])
+        texts = ["short", "tiny", "x" * 100, "y" * 120]
+
+        async def submit_all():
+            return await asyncio.gather(*(scheduler.submit(text) for text in texts))
+
+        # when
+        results = asyncio.run(submit_all())
+        scheduler.stop()
+
+        # then
+        assert results == texts
+        assert sorted(batches) == [["short", "tiny"], ["x" * 100, "y" * 120]]
+
+    def test_stopped_scheduler_rejects_requests(self):
+        # given
+        scheduler = BatchScheduler(lambda texts: texts)
+        asyncio.run(scheduler.submit("a"))
+
+        # when
+        scheduler.stop()
+
+        # then
+        with pytest.raises(SchedulerClosedError):
+            asyncio.run(scheduler.submit("b"))
+        assert scheduler._worker is None
+
+    def test_length_bucket_rounds_up_to_power_of_two(self):
+        # given / when / then
+        assert length_bucket(1) == 16
+        assert length_bucket(16) == 16
+        assert length_bucket(17) == 32
+        assert length_bucket(500) == 512
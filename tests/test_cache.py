@@ -0,0 +1,52 @@
+from app.services.cache import LRUCache, hash_key
+
+
+class TestLRUCache:
+    def test_get_returns_stored_value(self):
+        # given
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+
+        # when
+        value = cache.get("a")
+
+        # then
+        assert value == 1
+        assert cache.stats() == {"size": 1, "maxsize": 2, "bytes": 0, "maxbytes": None, "hits": 1, "misses": 0}
+
+    def test_least_recently_used_entry_is_evicted(self):
+        # given
+        cache = LRUCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+
+        # when
+        cache.put("c", 3)
+
+        # then
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+
+    def test_entries_are_evicted_beyond_maxbytes(self):
+        # given
+        cache = LRUCache(maxsize=8, maxbytes=10)
+        cache.put("a", b"abcd")
+        cache.put("b", b"efgh")
+
+        # when
+        cache.put("c", b"ijkl")
+        cache.put("d", b"x" * 11)
+
+        # then
+        assert cache.get("a") is None
+        assert cache.get("b") == b"efgh"
+        assert cache.get("c") == b"ijkl"
+        assert cache.get("d") is None
+        assert cache.nbytes == 8
+
+    def test_hash_key_separates_parts(self):
+        # given / when / then
+        assert hash_key("gpt2", "text") == hash_key("gpt2", "text")
+        assert hash_key("gpt2", "text") != hash_key("gpt", "2text")
@@ -1,25 +1,10 @@
-import pytest
-from fastapi.testclient import TestClient
+import base64
 import numpy as np
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 
-from app.main import app
-from tests.mock_model_service import MockModelService
+from app.core.responses import decode_raw
 
-# Create test client
-client = TestClient(app)
-
-# Mock the model service
-@pytest.fixture(autouse=True)
-def mock_model_service(monkeypatch):
-    # given
-    def mock_init(*args, **kwargs):
-        return MockModelService(*args, **kwargs)
-    
-    # Apply the mock
-    monkeypatch.setattr("app.services.model_service.ModelService", mock_init)
-
-def test_attention_endpoint_basic():
+def test_attention_endpoint_basic(client):
     # given
     test_text = "Hello world"
     
@@ -43,20 +28,24 @@ def test_attention_endpoint_basic():
     assert "reduced_embeddings" not in data
     
     # Check that the attention data has the correct structure
-    assert isinstance(data["attention"], list)  # List of layers
-    assert len(data["attention"]) > 0  # At least one layer
-    assert isinstance(data["attention"][0], list)  # List of heads
-    assert len(data["attention"][0]) > 0  # At least one head
-    assert isinstance(data["attention"][0][0], list)  # List of tokens (rows)
-    assert len(data["attention"][0][0]) == len(data["tokens"])  # Number of rows matches number of tokens
-    assert isinstance(data["attention"][0][0][0], list)  # List of attention weights (columns)
-    assert len(data["attention"][0][0][0]) == len(data["tokens"])  # Number of columns matches number of tokens
+    attention = data["attention"]
+    num_tokens = len(data["tokens"])
+    assert isinstance(attention, list)  # List of layers
+    assert len(attention) > 0  # At least one layer
+    heads = attention[0]
+    assert isinstance(heads, list)  # List of heads
+    assert len(heads) > 0  # At least one head
+    rows = heads[0]
+    assert isinstance(rows, list)  # List of tokens (rows)
+    assert len(rows) == num_tokens  # Number of rows matches number of tokens
+    assert isinstance(rows[0], list)  # List of attention weights (columns)
+    assert len(rows[0]) == num_tokens  # Number of columns matches number of tokens
     
     # Check that the model name is correct
     assert data["model_name"] == "gpt2"
 
 @patch("app.services.model_manager.ModelManager.get_model")
-def test_attention_endpoint_error_handling(mock_get_model):
+def test_attention_endpoint_error_handling(mock_get_model, client):
     # given
     # Make the get_model method raise an exception
     mock_get_model.side_effect = ValueError("Failed to load model")
@@ -72,4 +61,99 @@ def test_attention_endpoint_error_handling(mock_get_model):
     # then
     assert response.status_code == 400
     data = response.json()
-    assert "detail" in data 
\ No newline at end of file
+    assert "detail" in data 
+
+def test_attention_endpoint_binary_format(client):
+    # given
+    test_text = "Hello world"
+    
+    # when
+    response = client.post(
+        "/attention?format=binary",
+        json={"text": test_text, "model_name": "mock-gpt2"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    data = response.json()
+    attention = data["attention"]
+    assert attention["dtype"] == "float16"
+    
+    # Check that the decoded buffer is [num_layers, num_heads, num_tokens, num_tokens]
+    values = np.frombuffer(base64.b64decode(attention["data_b64"]), dtype=np.float16).reshape(attention["shape"])
+    assert values.ndim == 4
+    assert values.shape[2:] == (len(data["tokens"]), len(data["tokens"]))
+
+def test_attention_endpoint_mean_heads_top_k(client):
+    # given
+    test_text = "Hello world this is"
+    
+    # when
+    response = client.post(
+        "/attention",
+        json={"text": test_text, "model_name": "mock-gpt2", "head_reduction": "mean", "top_k": 2}
+    )
+    
+    # then
+    assert response.status_code == 200
+    data = response.json()
+    attention = np.array(data["attention"])
+    indices = np.array(data["attention_indices"])
+    assert attention.shape[1] == 1  # heads combined into one
+    assert attention.shape[2:] == (len(data["tokens"]), 2)
+    assert indices.shape == attention.shape
+    # Weights are ordered from the strongest to the weakest
+    assert np.all(attention[..., 0] >= attention[..., 1])
+
+def test_attention_endpoint_int8_binary_round_trip(client):
+    # given
+    test_text = "Quantized attention weights"
+    
+    # when
+    full = client.post("/attention", json={"text": test_text, "model_name": "mock-gpt2"}).json()
+    quantized = client.post(
+        "/attention?format=binary",
+        json={"text": test_text, "model_name": "mock-gpt2", "precision": "int8"}
+    ).json()
+    
+    # then
+    attention = quantized["attention"]
+    assert attention["dtype"] == "uint8"
+    values = np.frombuffer(base64.b64decode(attention["data_b64"]), dtype=np.uint8).reshape(attention["shape"])
+    # One byte per weight, within half a quantization step of the float32 weights
+    np.testing.assert_allclose(values * quantized["scale"], np.array(full["attention"]), atol=0.5 / 255 + 1e-6)
+
+def test_attention_endpoint_fp16_json(client):
+    # given
+    test_text = "Half precision attention"
+    
+    # when
+    full = client.post("/attention", json={"text": test_text, "model_name": "mock-gpt2"}).json()
+    response = client.post(
+        "/attention",
+        json={"text": test_text, "model_name": "mock-gpt2", "precision": "fp16"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    expected = np.array(full["attention"], dtype=np.float32).astype(np.float16)
+    np.testing.assert_array_equal(np.array(response.json()["attention"], dtype=np.float16), expected)
+
+def test_attention_endpoint_raw_format_top_k(client):
+    # given
+    test_text = "Raw attention weights"
+    
+    # when
+    response = client.post(
+        "/attention?format=raw",
+        json={"text": test_text, "model_name": "mock-gpt2", "top_k": 2}
+    )
+    
+    # then
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    header, arrays = decode_raw(response.content)
+    assert arrays["attention"].dtype == np.float16
+    assert arrays["attention"].shape[2:] == (len(header["tokens"]), 2)
+    assert arrays["attention_indices"].shape == arrays["attention"].shape
+    assert header["scale"] is None
@@ -1,25 +1,11 @@
-import pytest
-from fastapi.testclient import TestClient
+import base64
 import numpy as np
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
 
-from app.main import app
-from tests.mock_model_service import MockModelService
+from app.core.responses import decode_raw
+from app.services.model_manager import ModelManager
 
-# Create test client
-client = TestClient(app)
-
-# Mock the model service
-@pytest.fixture(autouse=True)
-def mock_model_service(monkeypatch):
-    # given
-    def mock_init(*args, **kwargs):
-        return MockModelService(*args, **kwargs)
-    
-    # Apply the mock
-    monkeypatch.setattr("app.services.model_service.ModelService", mock_init)
-
-def test_embeddings_endpoint_basic():
+def test_embeddings_endpoint_basic(client):
     # given
     test_text = "Hello world"
     
@@ -53,7 +39,7 @@ def test_embeddings_endpoint_basic():
     assert data["model_name"] == "gpt2"
 
 @patch("app.services.model_manager.ModelManager.get_model")
-def test_embeddings_endpoint_error_handling(mock_get_model):
+def test_embeddings_endpoint_error_handling(mock_get_model, client):
     # given
     # Make the get_model method raise an exception
     mock_get_model.side_effect = ValueError("Failed to load model")
@@ -69,4 +55,91 @@ def test_embeddings_endpoint_error_handling(mock_get_model):
     # then
     assert response.status_code == 400
     data = response.json()
-    assert "detail" in data 
\ No newline at end of file
+    assert "detail" in data 
+
+def test_embeddings_endpoint_binary_format(client):
+    # given
+    test_text = "Hello world"
+    
+    # when
+    response = client.post(
+        "/embeddings?format=binary",
+        json={"text": test_text, "model_name": "mock-gpt2"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    data = response.json()
+    embeddings = data["embeddings"]
+    assert embeddings["dtype"] == "float16"
+    
+    # Check that the decoded buffer matches the advertised shape
+    values = np.frombuffer(base64.b64decode(embeddings["data_b64"]), dtype=np.float16).reshape(embeddings["shape"])
+    assert values.shape[0] == len(data["tokens"])
+
+def test_embeddings_endpoint_int8_precision(client):
+    # given
+    test_text = "Hello world"
+    
+    # when
+    response = client.post(
+        "/embeddings",
+        json={"text": test_text, "model_name": "mock-gpt2", "precision": "int8"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["scale"]) == len(data["tokens"])
+    assert all(-127 <= value <= 127 and value == int(value) for row in data["embeddings"] for value in row)
+
+def test_embeddings_endpoint_fp16_json(client):
+    # given
+    test_text = "Half precision embeddings"
+    
+    # when
+    full = client.post("/embeddings", json={"text": test_text, "model_name": "mock-gpt2"}).json()
+    response = client.post(
+        "/embeddings",
+        json={"text": test_text, "model_name": "mock-gpt2", "precision": "fp16"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    data = response.json()
+    assert data["scale"] is None
+    expected = np.array(full["embeddings"], dtype=np.float32).astype(np.float16)
+    np.testing.assert_array_equal(np.array(data["embeddings"], dtype=np.float16), expected)
+
+def test_embeddings_endpoint_raw_format(client):
+    # given
+    test_text = "Hello world"
+    
+    # when
+    full = client.post("/embeddings", json={"text": test_text, "model_name": "mock-gpt2"}).json()
+    response = client.post(
+        "/embeddings?format=raw",
+        json={"text": test_text, "model_name": "mock-gpt2", "precision": "fp32"}
+    )
+    
+    # then
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    header, arrays = decode_raw(response.content)
+    assert header["tokens"] == full["tokens"]
+    np.testing.assert_array_equal(arrays["embeddings"], np.array(full["embeddings"], dtype=np.float32))
+
+def test_embeddings_endpoint_serves_repeated_requests_from_cache(client):
+    # given
+    request = {"text": "Cached response text", "model_name": "mock-gpt2"}
+    embeddings = np.ones((2, 4), dtype=np.float32)
+    
+    with patch.object(ModelManager, "get_embeddings", new_callable=AsyncMock, return_value=(["Cached", "text"], embeddings)) as mock_get_embeddings:
+        # when
+        first = client.post("/embeddings", json=request)
+        second = client.post("/embeddings", json=request)
+    
+    # then
+    assert first.status_code == second.status_code == 200
+    assert first.content == second.content
+    assert mock_get_embeddings.await_count == 1
@@ -0,0 +1,46 @@
+import pytest
+
+import logging
+
+from app.api.endpoints.logs import read_last_lines
+from app.core.logging_config import RingBufferHandler
+
+
+@pytest.mark.parametrize("lines", [1, 3, 5, 10])
+def test_read_last_lines_matches_readlines(tmp_path, lines):
+    # given
+    log_file = tmp_path / "api.log"
+    log_file.write_text("".join(f"line {i}\n" for i in range(5)))
+    
+    # when
+    tail = read_last_lines(str(log_file), lines, block_size=4)
+    
+    # then
+    with open(log_file) as f:
+        expected = "".join(f.readlines()[-lines:])
+    assert tail == expected
+
+def test_read_last_lines_without_trailing_newline(tmp_path):
+    # given
+    log_file = tmp_path / "api.log"
+    log_file.write_text("first\nsecond\nthird")
+    
+    # when
+    tail = read_last_lines(str(log_file), 2, block_size=4)
+    
+    # then
+    assert tail == "second\nthird"
+
+def test_ring_buffer_keeps_the_most_recent_lines():
+    # given
+    handler = RingBufferHandler(capacity=3)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    # when
+    for message in ["first", "second", "third\ncontinued"]:
+        handler.handle(logging.LogRecord("api", logging.INFO, __file__, 0, message, None, None))
+    
+    # then
+    assert handler.tail(2) == "third\ncontinued\n"
+    assert handler.tail(3) == "second\nthird\ncontinued\n"
+    assert handler.tail(4) is None
@@ -1,43 +1,31 @@
 import pytest
-from fastapi.testclient import TestClient
 import numpy as np
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
 
-from app.main import app
-from tests.mock_model_service import MockModelService
+from app.api.dependencies import get_reducer
+from app.services.model_manager import ModelManager
+from app.core.responses import decode_raw
 from tests.mock_reduction_service import MockDimensionalityReducer
 
-# Create test client
-client = TestClient(app)
+# Mock the dimensionality reducer once for the module, where get_reducer looks it up; get_reducer
+# caches its reducers, so real ones cached before and mock ones cached here do not leak across modules
+@pytest.fixture(scope="module", autouse=True)
+def mock_services():
+    get_reducer.cache_clear()
+    with patch("app.api.dependencies.DimensionalityReducer", MockDimensionalityReducer):
+        yield
+    get_reducer.cache_clear()
 
-# Mock the model service and dimensionality reducer
-@pytest.fixture(autouse=True)
-def mock_services(monkeypatch):
+@pytest.mark.parametrize("n_components, test_text", [
+    (2, "Hello world"),
+    (3, "Hello world this is a test with enough tokens for 3D reduction"),
+])
+def test_reduce_endpoint(n_components, test_text, client):
     # given
-    def mock_model_init(*args, **kwargs):
-        return MockModelService(*args, **kwargs)
-    
-    def mock_reducer_init(*args, **kwargs):
-        return MockDimensionalityReducer(*args, **kwargs)
-    
-    # Apply the mocks
-    monkeypatch.setattr("app.services.model_service.ModelService", mock_model_init)
-    monkeypatch.setattr("app.services.reduction_service.DimensionalityReducer", mock_reducer_init)
-
-def test_reduce_endpoint_2d():
-    # given
-    test_text = "Hello world"
+    request = {"text": test_text, "model_name": "gpt2", "reduction_method": "pca", "n_components": n_components}
     
     # when
-    response = client.post(
-        "/reduce",
-        json={
-            "text": test_text, 
-            "model_name": "gpt2",
-            "reduction_method": "pca",
-            "n_components": 2
-        }
-    )
+    response = client.post("/reduce", json=request)
     
     # then
     assert response.status_code == 200
@@ -55,39 +43,48 @@ def test_reduce_endpoint_2d():
     # Check that the number of tokens matches the number of reduced embeddings
     assert len(data["tokens"]) == len(data["reduced_embeddings"])
     
-    # Check that the reduced embeddings are 2D arrays with the correct shape
+    # Check that the reduced embeddings have one coordinate per component
     assert isinstance(data["reduced_embeddings"], list)
     assert isinstance(data["reduced_embeddings"][0], list)
-    assert len(data["reduced_embeddings"][0]) == 2  # 2D reduction
+    assert len(data["reduced_embeddings"][0]) == n_components
     
     # Check that the model name is correct
     assert data["model_name"] == "gpt2"
 
-def test_reduce_endpoint_3d():
+def test_reduce_endpoint_raw_format(client):
     # given
-    test_text = "Hello world this is a test with enough tokens for 3D reduction"
+    test_text = "Raw reduced embeddings"
     
     # when
     response = client.post(
-        "/reduce",
-        json={
-            "text": test_text, 
-            "model_name": "gpt2",
-            "reduction_method": "pca",
-            "n_components": 3
-        }
+        "/reduce?format=raw",
+        json={"text": test_text, "model_name": "mock-gpt2", "reduction_method": "pca", "n_components": 2}
     )
     
     # then
     assert response.status_code == 200
-    data = response.json()
+    assert response.headers["content-type"] == "application/octet-stream"
+    header, arrays = decode_raw(response.content)
+    assert arrays["reduced_embeddings"].dtype == np.float32
+    assert arrays["reduced_embeddings"].shape == (len(header["tokens"]), 2)
+
+def test_reduce_endpoint_reuses_reductions_across_formats(client, rng):
+    # given
+    request = {"text": "Reduced once", "model_name": "mock-gpt2", "reduction_method": "pca", "n_components": 2}
+    embeddings = rng.random((4, 16), dtype=np.float32)
     
-    # Check that the reduced embeddings are 3D
-    assert len(data["reduced_embeddings"][0]) == 3  # 3D reduction
+    with patch.object(ModelManager, "get_embeddings_for_reduction", new_callable=AsyncMock, return_value=(["a", "b", "c", "d"], embeddings)) as mock_get_embeddings:
+        # when
+        full = client.post("/reduce", json=request)
+        raw = client.post("/reduce?format=raw", json=request)
+    
+    # then
+    assert full.status_code == raw.status_code == 200
+    _, arrays = decode_raw(raw.content)
+    np.testing.assert_array_equal(arrays["reduced_embeddings"], np.array(full.json()["reduced_embeddings"], dtype=np.float32))
+    assert mock_get_embeddings.await_count == 1
 
-# Skip the UMAP test as it requires complex mocking of the model manager and reducer
-@pytest.mark.skip(reason="UMAP test requires complex mocking and is causing issues with the test suite")
-def test_reduce_endpoint_umap():
+def test_reduce_endpoint_umap(client):
     # given
     test_text = "Hello world"
     
@@ -110,7 +107,7 @@ def test_reduce_endpoint_umap():
     assert len(data["reduced_embeddings"][0]) == 2  # 2D reduction
 
 @patch("app.services.model_manager.ModelManager.get_model")
-def test_reduce_endpoint_error_handling(mock_get_model):
+def test_reduce_endpoint_error_handling(mock_get_model, client):
     # given
     # Make the get_model method raise an exception
     mock_get_model.side_effect = ValueError("Failed to load model")
@@ -123,7 +120,7 @@ def test_reduce_endpoint_error_handling(mock_get_model):
         json={
             "text": test_text, 
             "model_name": "nonexistent_model",
-            "reduction_method": "invalid_method",
+            "reduction_method": "pca",
             "n_components": 2
         }
     )
@@ -131,4 +128,29 @@ def test_reduce_endpoint_error_handling(mock_get_model):
     # then
     assert response.status_code == 400
     data = response.json()
-    assert "detail" in data 
\ No newline at end of file
+    assert data["detail"].startswith("Failed to load model nonexistent_model")
+
+def test_reduce_endpoint_fp16_json(client):
+    # given
+    request = {"text": "Half precision reduction", "model_name": "mock-gpt2", "reduction_method": "pca", "n_components": 2}
+    
+    # when
+    full = client.post("/reduce", json=request).json()
+    response = client.post("/reduce", json={**request, "precision": "fp16"})
+    
+    # then
+    assert response.status_code == 200
+    expected = np.array(full["reduced_embeddings"], dtype=np.float32).astype(np.float16)
+    np.testing.assert_array_equal(np.array(response.json()["reduced_embeddings"], dtype=np.float16), expected)
+
+def test_reduce_endpoint_invalid_method(client):
+    # given
+    request = {"text": "Hello world", "model_name": "gpt2", "reduction_method": "invalid_method", "n_components": 2}
+    
+    # when
+    response = client.post("/reduce", json=request)
+    
+    # then
+    assert response.status_code == 500
+    data = response.json()
+    assert data["detail"] == "Dimensionality reduction failed: Unsupported dimensionality reduction method: invalid_method" 
@@ -1,31 +1,46 @@
-import pytest
-from fastapi.testclient import TestClient
-import numpy as np
-import json
 import os
-from unittest.mock import patch, MagicMock
 
-# Import app directly from app.main
-from app.main import app
 
-# Create test client
-client = TestClient(app)
-
-def test_health_check():
+def test_health_check(client):
     # given
     # when
     response = client.get("/health")
     
     # then
     assert response.status_code == 200
-    assert response.json() == {"status": "healthy"}
+    data = response.json()
+    assert data["status"] == "healthy"
+    assert set(data["cache"]) == {"size", "maxsize", "bytes", "maxbytes", "hits", "misses"}
 
-def test_list_models():
+def test_list_models(client):
     # given
     # when
     response = client.get("/models")
     
     # then
     assert response.status_code == 200
-    assert "models" in response.json()
-    assert isinstance(response.json()["models"], list) 
\ No newline at end of file
+    data = response.json()
+    assert "models" in data
+    assert isinstance(data["models"], list)
+
+def test_request_ids_are_unique(client):
+    # given
+    # when
+    first = client.get("/health")
+    second = client.get("/health")
+    
+    # then
+    assert first.headers["X-Request-ID"] != second.headers["X-Request-ID"]
+    assert first.headers["X-Request-ID"].startswith(f"{os.getpid()}-")
+
+def test_large_request_bodies_pass_through_logging_middleware(client):
+    # given
+    body = {"text": ["word"] * 100_000}
+    
+    # when
+    response = client.post("/embeddings", json=body)
+    
+    # then
+    assert response.status_code == 422
+    assert "X-Request-ID" in response.headers
+    assert float(response.headers["X-Process-Time"]) >= 0
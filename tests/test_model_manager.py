@@ -0,0 +1,216 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+from app.services.cache import LRUCache
+from app.services.model_manager import ModelManager
+from tests.mock_model_service import MockModelService
+
+
+class SlowLoadingModelService(MockModelService):
+    loads = 0
+
+    def __init__(self, model_name: str = "mock-gpt2", **options):
+        SlowLoadingModelService.loads += 1
+        time.sleep(0.2)
+        super().__init__(model_name, **options)
+
+
+class RecordingModelService(MockModelService):
+    def __init__(self, model_name: str = "mock-gpt2", **options):
+        super().__init__(model_name, **options)
+        self.batches = []
+
+    def get_embeddings_and_attention_batch(self, texts, need_attention=True):
+        self.batches.append((list(texts), need_attention))
+        return super().get_embeddings_and_attention_batch(texts, need_attention)
+
+
+class StaleSchedulers(dict):
+    """Schedulers whose first lookup returns the given scheduler, as if it was looked up before an eviction"""
+
+    def __init__(self, schedulers, **stale):
+        super().__init__(schedulers)
+        self.stale = stale
+
+    def get(self, key, default=None):
+        if key in self.stale:
+            return self.stale.pop(key)
+        return super().get(key, default)
+
+
+class TestModelManager:
+    @patch("app.services.model_manager.ModelService", SlowLoadingModelService)
+    def test_model_loading_does_not_block_the_event_loop(self):
+        # given
+        manager = ModelManager()
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await asyncio.sleep(0.01)
+
+        async def run():
+            ticker = asyncio.create_task(tick())
+            result = await manager.get_embeddings("Hello world", "mock-gpt2")
+            ticker.cancel()
+            return result
+
+        # when
+        tokens, _ = asyncio.run(run())
+        manager.shutdown()
+
+        # then
+        assert tokens == ["Hello", "world"]
+        assert len(ticks) > 5
+
+    @patch("app.services.model_manager.ModelService", SlowLoadingModelService)
+    def test_concurrent_first_requests_load_the_model_once(self):
+        # given
+        manager = ModelManager()
+        SlowLoadingModelService.loads = 0
+
+        async def run():
+            return await asyncio.gather(*(manager.get_embeddings(text, "mock-gpt2") for text in ["a", "b", "c"]))
+
+        # when
+        asyncio.run(run())
+        manager.shutdown()
+
+        # then
+        assert SlowLoadingModelService.loads == 1
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_schedulers_use_the_configured_batching(self):
+        # given
+        manager = ModelManager(max_batch_size=4, batch_wait_timeout_s=0.05, max_tokens_per_batch=256)
+
+        # when
+        scheduler = manager.get_scheduler("mock-gpt2")
+
+        # then
+        assert scheduler.max_batch_size == 4
+        assert scheduler.batch_wait_timeout_s == 0.05
+        assert scheduler.max_tokens_per_batch == 256
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_model_options_are_passed_to_models(self):
+        # given
+        manager = ModelManager(model_options={"compile_model": True})
+
+        # when
+        model = manager.get_model("mock-gpt2")
+
+        # then
+        assert model.options == {"compile_model": True}
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_reference_reducer_is_fitted_once_per_model_and_dimensions(self):
+        # given
+        manager = ModelManager()
+
+        async def run():
+            first = await manager.get_reference_reducer("mock-gpt2", 2)
+            second = await manager.get_reference_reducer("mock-gpt2", 2)
+            three_d = await manager.get_reference_reducer("mock-gpt2", 3)
+            return first, second, three_d
+
+        # when
+        first, second, three_d = asyncio.run(run())
+        manager.shutdown()
+
+        # then
+        assert first is second
+        assert three_d is not first
+        assert three_d.n_components == 3
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_least_recently_used_model_is_unloaded(self):
+        # given
+        manager = ModelManager(max_models=2)
+        first = manager.get_model("first")
+        manager.get_scheduler("second")
+        second = manager.get_model("second")
+        manager.get_model("first")
+
+        # when
+        manager.get_model("third")
+
+        # then
+        assert manager.list_models() == ["first", "third"]
+        assert "second" not in manager.schedulers
+        assert second.unloaded
+        assert not getattr(first, "unloaded", False)
+        assert manager.get_model("first") is first
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_unloaded_model_outputs_are_dropped_from_the_caches(self):
+        # given
+        responses = LRUCache()
+        manager = ModelManager(max_models=1, model_caches=[responses])
+        asyncio.run(manager.get_embeddings("Hello world", "first"))
+        responses.put(("first", b"response"), b"body")
+        responses.put(("second", b"response"), b"body")
+
+        # when
+        manager.get_model("second")
+
+        # then
+        assert len(manager.result_cache) == 0
+        assert responses.get(("first", b"response")) is None
+        assert responses.get(("second", b"response")) == b"body"
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_request_to_an_unloaded_model_loads_it_again(self):
+        # given
+        manager = ModelManager(max_models=1)
+        stale = manager.get_scheduler("first")
+        manager.get_model("second")
+        manager.schedulers = StaleSchedulers(manager.schedulers, first=stale)
+
+        # when
+        tokens, _ = asyncio.run(manager.get_embeddings("Hello world", "first"))
+        manager.shutdown()
+
+        # then
+        assert tokens == ["Hello", "world"]
+        assert manager.list_models() == ["first"]
+        assert manager.schedulers["first"] is not stale
+        assert stale._worker is None
+
+    @patch("app.services.model_manager.ModelService", RecordingModelService)
+    def test_attention_is_only_computed_when_needed(self):
+        # given
+        manager = ModelManager()
+
+        async def run():
+            embeddings_result = await manager.get_embeddings("Hello world", "mock-gpt2")
+            attention_result = await manager.get_attention("Hello world", "mock-gpt2")
+            cached_result = await manager.get_embeddings("Hello world", "mock-gpt2")
+            return embeddings_result, attention_result, cached_result
+
+        # when
+        (_, embeddings), (_, attention), (_, cached_embeddings) = asyncio.run(run())
+        manager.shutdown()
+
+        # then
+        model = manager.get_model("mock-gpt2")
+        assert model.batches == [(["Hello world"], False), (["Hello world"], True)]
+        assert attention.shape == (2, 4, 2, 2)
+        assert cached_embeddings.shape == embeddings.shape
+
+    @patch("app.services.model_manager.ModelService", MockModelService)
+    def test_cuda_cache_is_emptied_every_n_batches(self):
+        # given
+        manager = ModelManager(empty_cache_every=2)
+        model = manager.get_model("mock-gpt2")
+
+        # when
+        with patch("app.services.model_manager.torch.cuda.is_available", return_value=True), \
+             patch("app.services.model_manager.torch.cuda.empty_cache") as empty_cache:
+            for text in ["a", "b", "c", "d", "e"]:
+                manager._process_batch(model, [(text, False)])
+
+        # then
+        assert empty_cache.call_count == 2
@@ -1,70 +1,295 @@
 import pytest
 import numpy as np
-from unittest.mock import patch, MagicMock
+import torch
+from types import SimpleNamespace
+from contextlib import nullcontext
 
-from app.services.model_service import ModelService
+from app.services.model_service import AutoModel, AutoTokenizer, ModelService
+
+
+class FakeEncoding(dict):
+    """Tokenizer output that, like a fast tokenizer's, also holds the token strings"""
+    
+    def __init__(self, tokens):
+        super().__init__(
+            input_ids=[list(range(len(text_tokens))) for text_tokens in tokens],
+            attention_mask=[[1] * len(text_tokens) for text_tokens in tokens]
+        )
+        self._tokens = tokens
+    
+    def tokens(self, index):
+        return self._tokens[index]
+
+
+class FakeTokenizer:
+    """Fast tokenizer stand-in that splits texts on spaces and records its calls"""
+    
+    is_fast = True
+    pad_token = "<pad>"
+    model_max_length = 1024
+    
+    def __init__(self):
+        self.padding_side = "right"
+        self.deprecation_warnings = {}
+        self.calls = []
+    
+    def __call__(self, texts, padding=False, truncation=False, max_length=None):
+        self.calls.append(list(texts))
+        return FakeEncoding([text.split()[:max_length if truncation else None] for text in texts])
+
+
+class FakeModel:
+    """Model stand-in returning a fixed output and recording the inputs of its forward passes"""
+    
+    def __init__(self, output):
+        self.output = output
+        self.calls = []
+    
+    def to(self, device):
+        return self
+    
+    def eval(self):
+        return self
+    
+    def __call__(self, **inputs):
+        self.calls.append(inputs)
+        return self.output
+
+
+# Output of a model with 1 layer, 4 heads and a hidden size of 8 for a two-token text,
+# built once as float32; torch.from_numpy shares the arrays, so they stay writable
+_RNG = np.random.default_rng(0)
+_HIDDEN = _RNG.standard_normal((2, 8), dtype=np.float32)
+_ATTENTION = _RNG.random((1, 4, 2, 2), dtype=np.float32)
+_OUTPUT = SimpleNamespace(
+    last_hidden_state=torch.from_numpy(_HIDDEN[np.newaxis]),
+    attentions=(torch.from_numpy(_ATTENTION),)
+)
+
+
+def use_fakes(monkeypatch, tokenizer=None, model=None):
+    """Load the given fake tokenizer and model (a new FakeModel per load by default); returns the model load kwargs"""
+    tokenizer = tokenizer or FakeTokenizer()
+    model_loads = []
+    
+    def load_model(*args, **kwargs):
+        model_loads.append(kwargs)
+        return model if model is not None else FakeModel(_OUTPUT)
+    
+    monkeypatch.setattr(AutoTokenizer, "from_pretrained", lambda *args, **kwargs: tokenizer)
+    monkeypatch.setattr(AutoModel, "from_pretrained", load_model)
+    return model_loads
 
 
 class TestModelService:
-    """Tests for the ModelService class using the mock implementation."""
+    """Tests for the ModelService class with the Hugging Face tokenizer and model replaced by fakes and mocks."""
     
-    def test_get_embeddings_and_attention(self):
+    @pytest.fixture(autouse=True)
+    def empty_model_caches(self, monkeypatch):
+        # Every test loads its tokenizer and model afresh, without touching the process-wide caches
+        monkeypatch.setattr("app.services.model_service._TOKENIZER_CACHE", {})
+        monkeypatch.setattr("app.services.model_service._MODEL_CACHE", {})
+    
+    def test_get_embeddings_and_attention(self, monkeypatch):
+        # given
+        # Replace the tokenizer and model with fakes
+        tokenizer = FakeTokenizer()
+        use_fakes(monkeypatch, tokenizer=tokenizer)
+        
+        # Create the model service
+        service = ModelService("gpt2")
+        
+        # when
+        tokens, hidden_states, attentions = service.get_embeddings_and_attention("Hello world")
+        
+        # then
+        # Token strings come from the encoding; FakeTokenizer cannot convert ids back
+        assert len(tokens) == 2
+        assert tokens == ["Hello", "world"]
+        assert hidden_states.shape[0] == 2  # Two tokens
+        assert hidden_states.shape[1] == 8  # Hidden dimension
+        assert len(attentions) == 1  # One layer of attention
+        assert attentions.shape == (1, 4, 2, 2)  # [num_layers, num_heads, seq_len, seq_len]
+        np.testing.assert_array_equal(hidden_states, _HIDDEN)
+        np.testing.assert_array_equal(attentions[0], _ATTENTION[0])
+        assert hidden_states.dtype == attentions.dtype == np.float32
+
+    def test_repeated_text_is_tokenized_once(self, monkeypatch):
+        # given
+        tokenizer = FakeTokenizer()
+        model = FakeModel(_OUTPUT)
+        use_fakes(monkeypatch, tokenizer=tokenizer, model=model)
+        service = ModelService("gpt2", device="cpu", dtype="float32")
+        
+        # when
+        service.count_tokens(["Hello world"])
+        service.get_embeddings_and_attention("Hello world")
+        service.get_embeddings_and_attention("Hello world")
+        
+        # then
+        assert tokenizer.calls == [["Hello world"]]
+        assert len(model.calls) == 2
+        assert model.calls[-1]["input_ids"].tolist() == [[0, 1]]
+
+    def test_slow_tokenizer_is_rejected(self, monkeypatch):
+        # given
+        tokenizer = FakeTokenizer()
+        tokenizer.is_fast = False
+        tokenizer_loads = []
+        
+        def load_tokenizer(*args, **kwargs):
+            tokenizer_loads.append((args, kwargs))
+            return tokenizer
+        
+        monkeypatch.setattr(AutoTokenizer, "from_pretrained", load_tokenizer)
+        
+        # when / then
+        with pytest.raises(ValueError, match="No fast tokenizer"):
+            ModelService("slow-model")
+        assert tokenizer_loads == [(("slow-model",), {"use_fast": True})]
+
+    def test_compile_falls_back_to_eager_model(self, monkeypatch):
+        # given
+        eager_model = FakeModel(_OUTPUT)
+        use_fakes(monkeypatch, model=eager_model)
+        
+        def fail_to_compile(*args, **kwargs):
+            raise RuntimeError("not supported")
+        
+        monkeypatch.setattr(torch, "compile", fail_to_compile)
+        
+        # when
+        service = ModelService("gpt2", compile_model=True)
+        
+        # then
+        assert service.model is eager_model
+
+    def test_unsupported_dtype_is_rejected(self):
+        # given / when / then
+        with pytest.raises(ValueError, match="Unsupported model dtype"):
+            ModelService("gpt2", device="cpu", dtype="int4")
+
+    def test_encodings_are_cached_per_text(self, monkeypatch):
+        # given
+        tokenizer = FakeTokenizer()
+        use_fakes(monkeypatch, tokenizer=tokenizer)
+        service = ModelService("gpt2")
+        
+        # when
+        first = service.count_tokens(["Hello world", "Hi"])
+        second = service.count_tokens(["Hi", "Hello world"])
+        
+        # then
+        assert first == [2, 1]
+        assert second == [1, 2]
+        assert tokenizer.calls == [["Hello world", "Hi"]]
+
+    def test_long_texts_are_truncated_to_the_model_max_length(self, monkeypatch):
+        # given
+        # The tokenizer reports no limit, so the model's position table sets it
+        tokenizer = FakeTokenizer()
+        tokenizer.model_max_length = int(1e30)
+        model = FakeModel(_OUTPUT)
+        model.config = SimpleNamespace(max_position_embeddings=4)
+        use_fakes(monkeypatch, tokenizer=tokenizer, model=model)
+        service = ModelService("gpt2")
+        
+        # when
+        lengths = service.count_tokens(["one two three four five six", "one two"])
+        
+        # then
+        assert service.max_length == 4
+        assert lengths == [4, 2]
+    
+    def test_models_are_cached_per_load_options(self, monkeypatch):
+        # given
+        model_loads = use_fakes(monkeypatch)
+        
+        # when
+        first = ModelService("gpt2", device="cpu", dtype="float32")
+        second = ModelService("gpt2", device="cpu", dtype="float32")
+        half = ModelService("gpt2", device="cpu", dtype="float16")
+        
+        # then
+        assert first.model is second.model
+        assert half.model is not first.model
+        assert len(model_loads) == 2
+
+    def test_quantize_replaces_linear_layers_on_cpu(self, monkeypatch):
+        # given
+        use_fakes(monkeypatch, model=torch.nn.Sequential(torch.nn.Linear(4, 4), torch.nn.ReLU()))
+        
+        # when
+        service = ModelService("gpt2", device="cpu", dtype="float32", quantize=True)
+        
+        # then
+        assert isinstance(service.model[0], torch.ao.nn.quantized.dynamic.Linear)
+
+    def test_quantize_is_skipped_for_half_precision(self, monkeypatch):
+        # given
+        half_model = FakeModel(_OUTPUT)
+        use_fakes(monkeypatch, model=half_model)
+        
+        # when
+        service = ModelService("gpt2", device="cpu", dtype="float16", quantize=True)
+        
+        # then
+        assert service.model is half_model
+
+    def test_static_shapes_pad_batches_to_length_bucket(self, monkeypatch):
+        # given
+        tokenizer = FakeTokenizer()
+        pad_calls = []
+        
+        def pad(encoded, **kwargs):
+            pad_calls.append(kwargs)
+            raise RuntimeError("stop after padding")
+        
+        tokenizer.pad = pad
+        use_fakes(monkeypatch, tokenizer=tokenizer)
+        service = ModelService("gpt2", device="cpu")
+        service.static_shapes = True
+        
+        # when
+        with pytest.raises(RuntimeError, match="stop after padding"):
+            service.get_embeddings_and_attention_batch(["Hello world"])
+        
+        # then
+        assert pad_calls[0]["padding"] == "max_length"
+        assert pad_calls[0]["max_length"] == 16
+
+    def test_auto_dtype_prefers_bfloat16_on_supporting_gpus(self, monkeypatch):
+        # given
+        model_loads = use_fakes(monkeypatch)
+        monkeypatch.setattr(torch.cuda, "device", lambda device: nullcontext())
+        monkeypatch.setattr(torch.cuda, "is_bf16_supported", lambda: True)
+        
+        # when
+        gpu_service = ModelService("gpt2", device="cuda")
+        cpu_service = ModelService("gpt2", device="cpu")
+        
+        # then
+        assert gpu_service.dtype == torch.bfloat16
+        assert cpu_service.dtype == torch.float32
+        assert model_loads[0]["torch_dtype"] == torch.bfloat16
+
+    def test_gpu_outputs_are_staged_in_a_reused_buffer(self, monkeypatch):
         # given
-        # Mock the tokenizer and model
-        with patch("app.services.model_service._TOKENIZER_CACHE", {}), \
-             patch("app.services.model_service._MODEL_CACHE", {}), \
-             patch("app.services.model_service.AutoTokenizer") as mock_tokenizer, \
-             patch("app.services.model_service.AutoModel") as mock_model:
-            
-            # Set up mock tokenizer
-            mock_tokenizer_instance = MagicMock()
-            mock_tokenizer.from_pretrained.return_value = mock_tokenizer_instance
-            
-            # Mock tokenizer behavior
-            mock_inputs = MagicMock()
-            mock_inputs.input_ids = MagicMock()
-            mock_inputs.input_ids.__getitem__.return_value = MagicMock()
-            mock_inputs.input_ids.__getitem__().tolist.return_value = [0, 1]
-            mock_tokenizer_instance.return_value = mock_inputs
-            mock_tokenizer_instance.convert_ids_to_tokens.return_value = ["Hello", "world"]
-            
-            # Set up mock model
-            mock_model_instance = MagicMock()
-            mock_model.from_pretrained.return_value = mock_model_instance
-            
-            # Mock model output
-            mock_output = MagicMock()
-            
-            # Mock last_hidden_state as a tensor that can be converted to numpy
-            mock_tensor = MagicMock()
-            mock_tensor.cpu.return_value = mock_tensor
-            mock_tensor.numpy.return_value = np.random.rand(2, 768)
-            mock_output.last_hidden_state = MagicMock()
-            mock_output.last_hidden_state.__getitem__.return_value = mock_tensor
-            
-            # Mock attentions as a list of tensors
-            mock_attention_tensor = MagicMock()
-            mock_attention_tensor.__getitem__.return_value = mock_attention_tensor
-            mock_attention_tensor.cpu.return_value = mock_attention_tensor
-            
-            # Create a numpy array and convert it to a list
-            attention_array = np.random.rand(4, 2, 2)
-            attention_list = attention_array.tolist()
-            mock_attention_tensor.numpy.return_value = attention_array
-            
-            # Mock the model to return the attention tensor
-            mock_output.attentions = [mock_attention_tensor]
-            mock_model_instance.return_value = mock_output
-            
-            # Create the model service
-            service = ModelService("gpt2")
-            
-            # when
-            tokens, hidden_states, attentions = service.get_embeddings_and_attention("Hello world")
-            
-            # then
-            assert len(tokens) == 2
-            assert tokens == ["Hello", "world"]
-            assert hidden_states.shape[0] == 2  # Two tokens
-            assert hidden_states.shape[1] == 768  # Hidden dimension
-            assert len(attentions) == 1  # One layer of attention 
\ No newline at end of file
+        real_empty = torch.empty
+        use_fakes(monkeypatch)
+        # Pinned memory needs CUDA, so stage in pageable memory and skip the stream synchronization
+        monkeypatch.setattr(torch, "empty", lambda *args, pin_memory=False, **kwargs: real_empty(*args, **kwargs))
+        monkeypatch.setattr(torch.cuda, "current_stream", lambda device=None: SimpleNamespace(synchronize=lambda: None))
+        service = ModelService("gpt2", device="cpu")
+        service.device = "cuda"
+        
+        # when
+        first = service._to_host("attention", torch.ones(2, 3, dtype=torch.float16))
+        first_values = first.copy()
+        second = service._to_host("attention", torch.zeros(4))
+        
+        # then
+        assert first.dtype == np.float32
+        np.testing.assert_array_equal(first_values, np.ones((2, 3)))
+        assert np.shares_memory(first, second)
+        assert service._staging["attention"].numel() == 6
@@ -1,35 +1,27 @@
 import pytest
 import numpy as np
-from app.services.reduction_service import DimensionalityReducer
+from sklearn.decomposition import PCA
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from app.services.reduction_service import DimensionalityReducer, ReferencePCA, pca_project, scale_to_unit_range, standardize
 
 class TestDimensionalityReducer:
-    def test_pca_2d_reduction(self):
+    @pytest.mark.parametrize("n_components", [2, 3])
+    def test_pca_reduction(self, embeddings_10x768, n_components):
         # given
-        embeddings = np.random.rand(10, 768)  # 10 tokens, 768 dimensions
-        reducer = DimensionalityReducer(method="pca", n_components=2)
+        embeddings = embeddings_10x768
+        reducer = DimensionalityReducer(method="pca", n_components=n_components)
         
         # when
         reduced = reducer.reduce(embeddings)
         
         # then
-        assert reduced.shape == (10, 2)
-        assert np.all(reduced >= -1.001) and np.all(reduced <= 1.001)  # Check normalization to [-1, 1] with small tolerance
-    
-    def test_pca_3d_reduction(self):
-        # given
-        embeddings = np.random.rand(10, 768)  # 10 tokens, 768 dimensions
-        reducer = DimensionalityReducer(method="pca", n_components=3)
-        
-        # when
-        reduced = reducer.reduce(embeddings)
-        
-        # then
-        assert reduced.shape == (10, 3)
-        assert np.all(reduced >= -1.001) and np.all(reduced <= 1.001)  # Check normalization to [-1, 1] with small tolerance
+        assert reduced.shape == (10, n_components)
+        assert np.abs(reduced).max() <= 1.001  # Check normalization to [-1, 1] with small tolerance
     
-    def test_umap_2d_reduction(self):
+    @pytest.mark.slow
+    def test_umap_2d_reduction(self, embeddings_10x768):
         # given
-        embeddings = np.random.rand(10, 768)  # 10 tokens, 768 dimensions
+        embeddings = embeddings_10x768
         reducer = DimensionalityReducer(method="umap", n_components=2)
         
         # when
@@ -37,22 +29,77 @@ class TestDimensionalityReducer:
         
         # then
         assert reduced.shape == (10, 2)
-        assert np.all(reduced >= -1.001) and np.all(reduced <= 1.001)  # Check normalization to [-1, 1] with small tolerance
+        assert np.abs(reduced).max() <= 1.001  # Check normalization to [-1, 1] with small tolerance
     
-    def test_invalid_method(self):
+    def test_invalid_method(self, embeddings_10x768):
         # given
-        embeddings = np.random.rand(10, 768)  # 10 tokens, 768 dimensions
+        embeddings = embeddings_10x768
         reducer = DimensionalityReducer(method="invalid_method", n_components=2)
         
         # when/then
         with pytest.raises(ValueError, match="Unsupported dimensionality reduction method"):
             reducer.reduce(embeddings)
     
-    def test_not_enough_tokens(self):
+    def test_not_enough_tokens(self, embeddings_2x768):
         # given
-        embeddings = np.random.rand(2, 768)  # 2 tokens, 768 dimensions
+        embeddings = embeddings_2x768
         reducer = DimensionalityReducer(method="pca", n_components=3)
         
         # when/then
         with pytest.raises(ValueError, match="Cannot reduce 2 tokens to 3 dimensions"):
-            reducer.reduce(embeddings) 
\ No newline at end of file
+            reducer.reduce(embeddings) 
+
+    def test_standardize_matches_standard_scaler(self, rng):
+        # given
+        embeddings = rng.random((10, 768)) * 5
+        embeddings[:, 0] = 1.0  # constant feature
+        embeddings.setflags(write=False)
+        
+        # when
+        standardized = standardize(embeddings)
+        
+        # then
+        np.testing.assert_allclose(standardized, StandardScaler().fit_transform(embeddings), atol=1e-12)
+
+    @pytest.mark.parametrize("num_tokens, hidden_dim", [(12, 768), (300, 64), (300, 768)])
+    def test_pca_project_matches_pca_up_to_sign(self, rng, num_tokens, hidden_dim):
+        # given
+        # Decaying feature scales give well separated components, as in real embeddings, so the
+        # randomized SVD used when both dimensions exceed 256 converges to the exact ones
+        embeddings = rng.standard_normal((num_tokens, hidden_dim)) * 0.8 ** np.arange(hidden_dim)
+        expected = PCA(n_components=3, svd_solver="full").fit_transform(embeddings)
+        
+        # when
+        projected = pca_project(embeddings, 3)
+        
+        # then
+        signs = np.sign((projected * expected).sum(axis=0))
+        np.testing.assert_allclose(projected, expected * signs, atol=1e-8)
+
+    def test_scale_to_unit_range_matches_min_max_scaler(self, rng):
+        # given
+        reduced = rng.standard_normal((10, 3))
+        reduced[:, 2] = 0.5  # constant component
+        expected = MinMaxScaler(feature_range=(-1, 1)).fit_transform(reduced)
+        
+        # when
+        scaled = scale_to_unit_range(reduced)
+        
+        # then
+        np.testing.assert_allclose(scaled, expected, atol=1e-12)
+
+
+class TestReferencePCA:
+    def test_projects_onto_the_reference_basis(self, rng):
+        # given
+        reference = rng.random((50, 64))
+        embeddings = rng.random((10, 64))
+        reducer = ReferencePCA(n_components=3).fit(reference)
+        
+        # when
+        reduced = reducer.reduce(embeddings)
+        
+        # then
+        assert reduced.shape == (10, 3)
+        assert np.abs(reduced).max() <= 1.001
+        np.testing.assert_allclose(reducer.reduce(embeddings), reduced)
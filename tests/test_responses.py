@@ -0,0 +1,104 @@
+import json
+import numpy as np
+
+from app.core.responses import NumpyJSONResponse, decode_raw, encode_raw, quantize_attention, quantize_embeddings
+from app.models.response import EmbeddingsResponse
+
+
+class TestNumpyJSONResponse:
+    def test_renders_numpy_arrays(self):
+        # given
+        content = {"embeddings": np.array([[0.5, 1.0], [1.5, 2.0]], dtype=np.float32), "tokens": ["a", "b"]}
+
+        # when
+        body = NumpyJSONResponse(content).body
+
+        # then
+        assert json.loads(body) == {"embeddings": [[0.5, 1.0], [1.5, 2.0]], "tokens": ["a", "b"]}
+
+    def test_renders_non_contiguous_arrays(self):
+        # given
+        array = np.arange(16, dtype=np.float32).reshape(4, 4)[:, :2]
+
+        # when
+        body = NumpyJSONResponse({"values": array}).body
+
+        # then
+        assert json.loads(body) == {"values": array.tolist()}
+
+    def test_renders_half_precision_arrays(self):
+        # given
+        array = np.array([0.1, 1.5, -2.25], dtype=np.float16)
+
+        # when
+        body = NumpyJSONResponse({"values": array, "sliced": array[::2]}).body
+
+        # then
+        data = json.loads(body)
+        np.testing.assert_array_equal(np.array(data["values"], dtype=np.float16), array)
+        np.testing.assert_array_equal(np.array(data["sliced"], dtype=np.float16), array[::2])
+
+    def test_renders_unvalidated_models_with_arrays(self):
+        # given
+        model = EmbeddingsResponse.model_construct(
+            tokens=["a"],
+            embeddings=np.array([[0.5, 1.0]], dtype=np.float32),
+            model_name="gpt2"
+        )
+
+        # when
+        body = NumpyJSONResponse(model).body
+
+        # then
+        assert json.loads(body) == {"tokens": ["a"], "embeddings": [[0.5, 1.0]], "model_name": "gpt2", "scale": None}
+
+
+class TestQuantization:
+    def test_int8_embeddings_round_trip_with_per_token_scale(self):
+        # given
+        embeddings = np.array([[0.5, -1.0, 0.25], [10.0, 5.0, -2.5], [0.0, 0.0, 0.0]], dtype=np.float32)
+
+        # when
+        values, scale = quantize_embeddings(embeddings, "int8")
+
+        # then
+        assert values.dtype == np.int8
+        assert scale.shape == (3,)
+        np.testing.assert_allclose(values * scale[:, None], embeddings, atol=float(scale.max()) / 2)
+
+    def test_fp16_embeddings_have_no_scale(self):
+        # given
+        embeddings = np.array([[0.5, -1.0]], dtype=np.float32)
+
+        # when
+        values, scale = quantize_embeddings(embeddings, "fp16")
+
+        # then
+        assert values.dtype == np.float16
+        assert scale is None
+
+    def test_int8_attention_is_stored_as_uint8(self):
+        # given
+        attention = np.array([[[[1.0, 0.0], [0.3, 0.7]]]], dtype=np.float32)
+
+        # when
+        values, scale = quantize_attention(attention, "int8")
+
+        # then
+        assert values.dtype == np.uint8
+        np.testing.assert_allclose(values * scale, attention, atol=1 / 510)
+
+    def test_raw_body_round_trips_aligned_arrays(self, rng):
+        # given
+        embeddings = rng.random((3, 5), dtype=np.float32).astype(np.float16)
+        indices = np.arange(7, dtype=np.uint16)
+        
+        # when
+        body = encode_raw({"tokens": ["a", "b", "c"]}, [("embeddings", embeddings), ("indices", indices)])
+        header, arrays = decode_raw(body)
+        
+        # then
+        assert header["tokens"] == ["a", "b", "c"]
+        assert all(entry["offset"] % 8 == 0 for entry in header["arrays"])
+        np.testing.assert_array_equal(arrays["embeddings"], embeddings)
+        np.testing.assert_array_equal(arrays["indices"], indices)